@@ -2,40 +2,15 @@ import os
 import cv2
 import json
 import numpy as np
-import tensorflow as tf
-import mediapipe as mp
-from ultralytics import YOLO
+import model_registry
 from collections import defaultdict
 
 
-
-base_dir = os.path.dirname(__file__)
-yolo_path = os.path.join(base_dir, "model", "yolov8s.pt")
-tflite_path = os.path.join(base_dir, "model", "2.tflite")
-
-
 ###########################
 # 1. 신체 랜드마크 및 노출 판별 관련 함수들
 ###########################
 
-# YOLOv8 모델 로드 (모델 파일 경로를 필요에 따라 수정)
-model = YOLO(yolo_path)
-
-# MediaPipe Pose 초기화
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(
-    static_image_mode=True,
-    model_complexity=2,
-    enable_segmentation=False,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
-
-# TFLite 세그멘테이션 모델 로드 (모델 경로 수정)
-interpreter = tf.lite.Interpreter(model_path=tflite_path)
-interpreter.allocate_tensors()
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
+# YOLOv8 / MediaPipe Pose / TFLite 세그멘테이션은 모델 레지스트리에서 공유 (op_body와 같은 인스턴스)
 
 # 파라미터
 RADIUS = 20                  # 노출 판정 원 반경
@@ -51,19 +26,9 @@ def save_json(path, data):
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=4)
 
-def load_image(image_path, target_size):
-    img = cv2.imread(image_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    img = cv2.resize(img, target_size) / 255.0
-    return np.expand_dims(img, axis=0).astype(np.float32)
-
 def segment_image(image_path):
-    input_shape = input_details[0]['shape'][1:3]
-    img = load_image(image_path, tuple(input_shape))
-    interpreter.set_tensor(input_details[0]['index'], img)
-    interpreter.invoke()
-    seg_map = interpreter.get_tensor(output_details[0]['index'])[0]
-    return np.argmax(seg_map, axis=-1).astype(np.uint8)
+    # 모델 입력 해상도의 클래스 맵 (RGB 입력, 인터프리터는 세그멘테이션 엔진 풀에서 대여)
+    return model_registry.get("segmenter").segment(cv2.imread(image_path), rgb=True, resize=False)
 
 def get_skin_mask(image_path, seg_map):
     person_mask = (seg_map > 0).astype(np.uint8)
@@ -79,7 +44,7 @@ def get_skin_mask(image_path, seg_map):
     return skin_mask
 
 def detect_persons_yolo(image):
-    results = model.predict(image, conf=0.5)
+    results = model_registry.get("yolo").predict(image, conf=0.5)
     rects = []
     for result in results:
         for box in result.boxes:
@@ -97,7 +62,7 @@ def get_landmarks_multi(image):
     for (x1, y1, x2, y2) in rects:
         crop = image[y1:y2, x1:x2]
         crop_rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
-        results = pose.process(crop_rgb)
+        results = model_registry.get("pose").process(crop_rgb)
         if results.pose_landmarks:
             landmarks = {}
             crop_h, crop_w, _ = crop.shape
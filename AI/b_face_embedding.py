@@ -1,29 +1,19 @@
 # face_embedding.py
 # 다인 사진에서 임베딩을 추출하는 코드
 
-import os
 import cv2
 import json
 import numpy as np
-from insightface.app import FaceAnalysis
+import model_registry
 
-# ✅ 기본 경로 설정
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_DIR = os.path.join(BASE_DIR, "model")
-INSIGHTFACE_DIR = os.path.join(MODEL_DIR, "insightface")
-
-# ✅ InsightFace가 다운로드하지 않도록 강제 설정
-os.environ["INSIGHTFACE_HOME"] = INSIGHTFACE_DIR
-# 모델 준비
-app = FaceAnalysis(name="buffalo_l", root=INSIGHTFACE_DIR)  
-app.prepare(ctx_id=0)  # GPU 사용 (없으면 -1)
+# 얼굴 모델은 모델 레지스트리에서 공유 (embedding_extractor와 같은 인스턴스)
 
 def extract_face_embeddings(image_path, output_json_path):
     image = cv2.imread(image_path)
     if image is None:
         raise FileNotFoundError(f"이미지를 열 수 없습니다: {image_path}")
 
-    faces = app.get(image)
+    faces = model_registry.get("face").get(image)
     if not faces:
         raise ValueError("얼굴을 감지하지 못했습니다.")
 
@@ -1,5 +1,6 @@
 import json
 import numpy as np
+from face_index import build_index
 
 # 코사인 유사도 계산 함수
 def cosine_similarity(a, b):
@@ -7,8 +8,8 @@ def cosine_similarity(a, b):
     b = np.array(b, dtype=np.float32)
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
-# 코사인 유사도 기반 얼굴 매칭
-def find_matching_face(db_json_path, group_json_path, threshold=0.5):
+# 코사인 유사도 기반 얼굴 매칭 (DB의 모든 신원을 인덱스로 검색)
+def find_matching_face(db_json_path, group_json_path, threshold=0.5, index=None):
     with open(db_json_path, "r", encoding="utf-8") as f:
         db_faces = json.load(f)
     with open(group_json_path, "r", encoding="utf-8") as f:
@@ -17,17 +18,24 @@ def find_matching_face(db_json_path, group_json_path, threshold=0.5):
     if not db_faces or not group_faces:
         return None
 
-    db_embedding = np.array(db_faces[0]["embedding"], dtype=np.float32)
+    if index is None:
+        index = build_index()
+        index.add(list(range(len(db_faces))),
+                  np.array([face["embedding"] for face in db_faces], dtype=np.float32))
+
+    group_faces = [face for face in group_faces if face.get("embedding")]
+    if not group_faces:
+        return None
+    hits = index.search(np.array([face["embedding"] for face in group_faces], dtype=np.float32), k=1)
 
     max_sim = -1.0
     matched_bbox = None
 
-    for face in group_faces:
-        embedding = face.get("embedding", [])
-        if not embedding:
+    for face, face_hits in zip(group_faces, hits):
+        if not face_hits:
             continue
-        sim = cosine_similarity(db_embedding, embedding)
-        print(f"✅ 코사인 유사도: {sim:.4f}")
+        identity, sim = face_hits[0]
+        print(f"✅ 코사인 유사도: {sim:.4f} (db={identity})")
         if sim > max_sim:
             max_sim = sim
             matched_bbox = tuple(face["bbox"])
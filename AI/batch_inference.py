@@ -0,0 +1,150 @@
+# batch_inference.py
+# 여러 프레임을 묶어 얼굴 검출/인식을 배치로 실행하는 모듈 (onnxruntime 호출 횟수 감소)
+
+import os
+import cv2
+import numpy as np
+from insightface.app.common import Face
+from insightface.model_zoo.retinaface import distance2bbox, distance2kps
+from insightface.utils import face_align
+
+FACE_BATCH_SIZE = int(os.getenv("FACE_BATCH_SIZE", "8"))  # 한 번에 묶어 처리할 프레임 수
+
+
+def iter_batches(items, batch_size=FACE_BATCH_SIZE):
+    """이터레이터를 batch_size 단위 리스트로 묶어 yield"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def supports_batched_detection(det_model):
+    """검출 모델이 배치 입력을 지원하는지 확인 (배치 차원이 동적이고 출력에 배치 차원이 있는 경우)"""
+    batch_dim = det_model.session.get_inputs()[0].shape[0]
+    outputs = det_model.session.get_outputs()
+    return not isinstance(batch_dim, int) and len(outputs[0].shape) == 3
+
+
+def _letterbox(img, input_size):
+    """RetinaFace.detect와 동일한 비율 유지 리사이즈 + 패딩"""
+    im_ratio = float(img.shape[0]) / img.shape[1]
+    model_ratio = float(input_size[1]) / input_size[0]
+    if im_ratio > model_ratio:
+        new_height = input_size[1]
+        new_width = int(new_height / im_ratio)
+    else:
+        new_width = input_size[0]
+        new_height = int(new_width * im_ratio)
+    det_scale = float(new_height) / img.shape[0]
+    det_img = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
+    det_img[:new_height, :new_width, :] = cv2.resize(img, (new_width, new_height))
+    return det_img, det_scale
+
+
+def _decode(det_model, net_outs, input_height, input_width):
+    """배치 중 한 장의 네트워크 출력을 bbox / score / kps 후보로 변환"""
+    scores_list, bboxes_list, kpss_list = [], [], []
+    fmc = det_model.fmc
+    for idx, stride in enumerate(det_model._feat_stride_fpn):
+        scores = net_outs[idx]
+        bbox_preds = net_outs[idx + fmc] * stride
+        height, width = input_height // stride, input_width // stride
+        key = (height, width, stride)
+        anchor_centers = det_model.center_cache.get(key)
+        if anchor_centers is None:
+            anchor_centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+            anchor_centers = (anchor_centers * stride).reshape((-1, 2))
+            if det_model._num_anchors > 1:
+                anchor_centers = np.stack([anchor_centers] * det_model._num_anchors, axis=1).reshape((-1, 2))
+            det_model.center_cache[key] = anchor_centers
+
+        pos_inds = np.where(scores >= det_model.det_thresh)[0]
+        scores_list.append(scores[pos_inds])
+        bboxes_list.append(distance2bbox(anchor_centers, bbox_preds)[pos_inds])
+        if det_model.use_kps:
+            kpss = distance2kps(anchor_centers, net_outs[idx + fmc * 2] * stride)
+            kpss_list.append(kpss.reshape((kpss.shape[0], -1, 2))[pos_inds])
+    return scores_list, bboxes_list, kpss_list
+
+
+def _postprocess(det_model, scores_list, bboxes_list, kpss_list, det_scale):
+    """후보 정렬 + NMS (RetinaFace.detect와 동일한 결과 형식)"""
+    scores = np.vstack(scores_list)
+    order = scores.ravel().argsort()[::-1]
+    bboxes = np.vstack(bboxes_list) / det_scale
+    pre_det = np.hstack((bboxes, scores)).astype(np.float32, copy=False)[order, :]
+    keep = det_model.nms(pre_det)
+    det = pre_det[keep, :]
+    kpss = None
+    if det_model.use_kps:
+        kpss = (np.vstack(kpss_list) / det_scale)[order, :, :][keep, :, :]
+    return det, kpss
+
+
+def detect_batch(det_model, frames, input_size=None):
+    """여러 프레임을 하나의 배치 텐서로 검출 (배치 미지원 모델은 프레임별로 실행)"""
+    input_size = input_size or det_model.input_size
+    if not supports_batched_detection(det_model):
+        return [det_model.detect(frame, input_size=input_size, max_num=0, metric="default")
+                for frame in frames]
+
+    det_imgs, det_scales = zip(*(_letterbox(frame, input_size) for frame in frames))
+    mean = det_model.input_mean
+    blob = cv2.dnn.blobFromImages(list(det_imgs), 1.0 / det_model.input_std, input_size,
+                                  (mean, mean, mean), swapRB=True)
+    net_outs = det_model.session.run(det_model.output_names, {det_model.input_name: blob})
+
+    results = []
+    for b, det_scale in enumerate(det_scales):
+        candidates = _decode(det_model, [out[b] for out in net_outs], blob.shape[2], blob.shape[3])
+        results.append(_postprocess(det_model, *candidates, det_scale))
+    return results
+
+
+def recognize_batch(rec_model, items):
+    """(이미지, Face) 목록의 정렬된 얼굴 crop을 모아 인식 모델을 한 번에 실행"""
+    if not items:
+        return []
+    crops = [face_align.norm_crop(img, landmark=face.kps, image_size=rec_model.input_size[0])
+             for img, face in items]
+    feats = rec_model.get_feat(crops)
+    for (_, face), feat in zip(items, feats):
+        face.embedding = feat.flatten()
+    return [face.embedding for _, face in items]
+
+
+def analyze_frames(app, frames, input_size=None):
+    """FaceAnalysis.get의 배치 버전: 프레임별 Face 리스트 반환
+
+    input_size가 주어지면 해당 검출 해상도로 실행 (bbox/kps는 원본 프레임 좌표로 반환되므로
+    정렬 crop과 인식은 원본 해상도에서 수행됨)
+    """
+    detections = detect_batch(app.det_model, frames, input_size=input_size)
+
+    faces_per_frame = []
+    pending = []
+    for frame, (bboxes, kpss) in zip(frames, detections):
+        faces = []
+        for i in range(bboxes.shape[0]):
+            face = Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None,
+                        det_score=bboxes[i, 4])
+            faces.append(face)
+            pending.append((frame, face))
+        faces_per_frame.append(faces)
+
+    if "recognition" in app.models:
+        recognize_batch(app.models["recognition"], pending)
+
+    # 나머지 모듈(랜드마크/성별·나이 등)은 얼굴별로 실행
+    for frame, face in pending:
+        for taskname, model in app.models.items():
+            if taskname in ("detection", "recognition"):
+                continue
+            model.get(frame, face)
+
+    return faces_per_frame
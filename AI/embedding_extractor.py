@@ -4,6 +4,16 @@ import cv2
 import numpy as np
 import torch
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.model_zoo.retinaface import RetinaFace
+from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+from insightface.model_zoo.landmark import Landmark
+from insightface.model_zoo.attribute import Attribute
+from ort_sessions import create_session
+from batch_inference import FACE_BATCH_SIZE, analyze_frames, iter_batches, recognize_batch
+import model_registry
+from gallery import Gallery
+from scipy.optimize import linear_sum_assignment
 import time
 
 
@@ -15,16 +25,89 @@ INSIGHTFACE_DIR = os.path.join(MODEL_DIR, "insightface")
 # ✅ InsightFace가 다운로드하지 않도록 강제 설정
 os.environ["INSIGHTFACE_HOME"] = INSIGHTFACE_DIR
 
-# ✅ ArcFace 모델 로드 (로컬에서 불러오기, **name="buffalo_l"으로 설정해야 함**)
-arcface_app = FaceAnalysis(name="buffalo_l", root=INSIGHTFACE_DIR)  # ✅ 모델 이름을 명확하게 지정
-arcface_app.prepare(ctx_id=-1)  # CPU 사용
+# ✅ 모델 프로파일: 필요한 InsightFace 모듈만 로드 (None이면 buffalo_l 전체)
+MODEL_PROFILES = {
+    "detect-only": ["detection"],                       # bbox / kps만 필요한 경우
+    "detect+recognize": ["detection", "recognition"],   # bbox + 임베딩 (현재 모든 엔드포인트)
+    "full": None,                                       # 3D/2D 랜드마크, 성별·나이 포함
+}
+FACE_MODEL_PROFILE = os.getenv("FACE_MODEL_PROFILE", "detect+recognize")
 
-print("✅ YOLO 및 ArcFace 모델이 정상적으로 로드되었습니다.")
+# ✅ 검출/인식 모델 정밀도: fp32 또는 int8 (quantize_models.py로 만든 *_int8.onnx 사용)
+FACE_MODEL_PRECISION = os.getenv("FACE_MODEL_PRECISION", "fp32")
+QUANTIZED_TASKS = ("detection", "recognition")
+
+# buffalo_l 모듈별 (ONNX 파일, InsightFace 모델 클래스)
+BUFFALO_L_FILES = {
+    "detection": ("det_10g.onnx", RetinaFace),
+    "recognition": ("w600k_r50.onnx", ArcFaceONNX),
+    "landmark_3d_68": ("1k3d68.onnx", Landmark),
+    "landmark_2d_106": ("2d106det.onnx", Landmark),
+    "genderage": ("genderage.onnx", Attribute),
+}
+
+def quantized_model_path(model_file):
+    return model_file.replace(".onnx", "_int8.onnx")
+
+def session_model_path(taskname, model_file, precision=FACE_MODEL_PRECISION, strict=False):
+    """정밀도에 맞는 세션용 ONNX 경로 (INT8 파일이 없으면 fp32로 대체, strict=True면 FileNotFoundError)"""
+    if precision == "fp32" or taskname not in QUANTIZED_TASKS:
+        return model_file
+    if precision != "int8":
+        raise ValueError(f"알 수 없는 모델 정밀도: {precision}")
+    int8_file = quantized_model_path(model_file)
+    if not os.path.exists(int8_file):
+        if strict:
+            raise FileNotFoundError(f"🚨 INT8 모델 없음: {int8_file} (quantize_models.py로 먼저 생성)")
+        print(f"⚠️ INT8 모델 없음 → fp32 사용: {int8_file}")
+        return model_file
+    return int8_file
+
+def load_face_app(profile=FACE_MODEL_PROFILE, precision=FACE_MODEL_PRECISION, strict=False):
+    """ArcFace 모델 인스턴스 생성 (로컬에서 불러오기, **name="buffalo_l"으로 설정해야 함**)
+
+    profile에 포함된 모듈의 ONNX 세션만 생성 (FaceAnalysis는 폴더의 모든 모델을 로드하므로 직접 구성),
+    세션은 ort_sessions에서 튜닝된 옵션 + 캐시된 최적화 그래프로 생성,
+    precision="int8"이면 검출/인식 세션만 양자화 모델로 생성 (전처리 정보는 fp32 모델 그래프에서 읽음),
+    strict=True면 INT8 파일이 없을 때 fp32로 대체하지 않고 FileNotFoundError
+    app.precisions에 모듈별로 실제 로드된 정밀도 기록
+    """
+    if profile not in MODEL_PROFILES:
+        raise ValueError(f"알 수 없는 모델 프로파일: {profile}")
+
+    modules = MODEL_PROFILES[profile] or list(BUFFALO_L_FILES)
+    app = FaceAnalysis.__new__(FaceAnalysis)
+    app.model_dir = os.path.join(INSIGHTFACE_DIR, "models", "buffalo_l")  # ✅ 모델 이름을 명확하게 지정
+    app.models = {}
+    app.precisions = {}
+    for taskname in modules:
+        filename, model_cls = BUFFALO_L_FILES[taskname]
+        model_file = os.path.join(app.model_dir, filename)
+        session_file = session_model_path(taskname, model_file, precision, strict)
+        session = create_session(session_file)
+        app.models[taskname] = model_cls(model_file=model_file, session=session)
+        app.precisions[taskname] = "fp32" if session_file == model_file else "int8"
+    app.det_model = app.models["detection"]
+    app.prepare(ctx_id=-1)  # CPU 사용
+    print(f"✅ 얼굴 모델 프로파일 로드: {profile}/{precision} "
+          f"({', '.join(f'{task}:{p}' for task, p in app.precisions.items())})")
+    return app
+
+def get_face_app():
+    """공유 ArcFace 모델 (모델 레지스트리에서 처음 사용할 때 로드)"""
+    return model_registry.get("face")
+
+def __getattr__(name):
+    # 기존 코드 호환: embedding_extractor.arcface_app 접근 시 레지스트리 인스턴스 반환
+    if name == "arcface_app":
+        return get_face_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 EMBEDDING_DIR = os.path.join(BASE_DIR, "embeddings")
 os.makedirs(EMBEDDING_DIR, exist_ok=True)
 
 MAX_CAPTURE = 5  # 최대 5장 평균
+FACE_ONE_TO_ONE = os.getenv("FACE_ONE_TO_ONE", "0") == "1"  # 한 프레임에서 가족 구성원 한 명당 얼굴 하나만 매칭
 
 def adjust_bbox_for_retina(yolo_bbox, scale_factor=1.2):
     """ YOLO의 바운딩 박스를 20% 확대하여 RetinaFace와 유사한 크기로 변환 """
@@ -33,11 +116,18 @@ def adjust_bbox_for_retina(yolo_bbox, scale_factor=1.2):
     new_w, new_h = w * scale_factor, h * scale_factor
     return [max(0, cx - new_w / 2), max(0, cy - new_h / 2), new_w, new_h]
 
-def extract_faces_and_embeddings(image):
+def detect_faces(image, app=None, det_size=None):
+    """FaceAnalysis.get과 동일 (det_size가 주어지면 해당 검출 해상도로 실행, 좌표는 원본 기준)"""
+    app = app or get_face_app()
+    if det_size is None:
+        return app.get(image)
+    return analyze_frames(app, [image], input_size=(det_size, det_size))[0]
+
+def extract_faces_and_embeddings(image, app=None, det_size=None):
     """ 사용자의 얼굴을 YOLO로 검출 후 임베딩 추출하고 평균 계산 """
     embeddings_list = []
 
-    faces = arcface_app.get(image)
+    faces = detect_faces(image, app, det_size)
     if not faces:
         print("❌ 얼굴 감지 실패")
         return None
@@ -59,39 +149,368 @@ def extract_faces_and_embeddings(image):
     avg_embedding = avg_embedding / np.linalg.norm(avg_embedding)
     return avg_embedding.tolist()
 
-def mask_matching_face(image, family_embeddings, mask_type="black", threshold=0.5, emojis=None):
-    faces = arcface_app.get(image)
+def apply_mask(image, bbox, mask_type="black", emojis=None):
+    """bbox(x_min, y_min, x_max, y_max) 영역에 마스킹 적용"""
+    h_img, w_img = image.shape[:2]
+    x_min, y_min, x_max, y_max = map(int, bbox)
+    x_min, y_min = max(0, x_min), max(0, y_min)
+    x_max, y_max = min(w_img, x_max), min(h_img, y_max)
+    w, h = x_max - x_min, y_max - y_min
+    if w <= 0 or h <= 0:
+        return image
+
+    if mask_type == "black":
+        cv2.rectangle(image, (x_min, y_min), (x_max, y_max), (0, 0, 0), -1)
+    elif mask_type == "blur":
+        face_roi = image[y_min:y_max, x_min:x_max]
+        face_roi = cv2.GaussianBlur(face_roi, (55, 55), 30)
+        image[y_min:y_max, x_min:x_max] = face_roi
+    elif emojis and mask_type in emojis and emojis[mask_type] is not None:
+        emoji = cv2.resize(emojis[mask_type], (w, h))
+        image[y_min:y_max, x_min:x_max] = emoji
+
+    return image
+
+def as_gallery(family_embeddings):
+    """{user_id: 정규화된 임베딩} → Gallery (이미 Gallery면 그대로, 행렬은 한 번만 구성)"""
+    if isinstance(family_embeddings, Gallery):
+        return family_embeddings
+    return Gallery.from_embeddings(family_embeddings)
+
+def match_faces(face_embeddings, family_embeddings, threshold=0.5, one_to_one=False):
+    """얼굴 임베딩 행렬(N, 512, 정규화됨) × 가족 행렬을 한 번에 계산해 얼굴별 (user_id, sim) 리스트 반환
+
+    one_to_one=True면 헝가리안 알고리즘으로 가족 구성원 한 명당 얼굴 하나만 매칭
+    """
+    gallery = as_gallery(family_embeddings)
+    face_embeddings = np.asarray(face_embeddings, dtype=np.float32)
+    if face_embeddings.ndim == 1 and face_embeddings.size:
+        face_embeddings = face_embeddings[np.newaxis]  # 임베딩 하나
+    if len(face_embeddings) == 0 or len(gallery) == 0:
+        return [(None, -1.0)] * len(face_embeddings)
+    if face_embeddings.ndim != 2 or face_embeddings.shape[1] != gallery.matrix.shape[1]:
+        raise ValueError(f"🚨 임베딩 차원 불일치: 얼굴 {face_embeddings.shape} / 가족 {gallery.matrix.shape}")
+
+    sims = face_embeddings @ gallery.matrix.T  # (얼굴 수, 가족 수)
+    best = sims.argmax(axis=1)
+    best_sims = sims[np.arange(len(sims)), best]
+    matched = best_sims >= threshold
+
+    if one_to_one:
+        rows, cols = linear_sum_assignment(-sims)
+        best[rows] = cols
+        best_sims[rows] = sims[rows, cols]
+        matched = np.zeros(len(sims), dtype=bool)
+        matched[rows] = sims[rows, cols] >= threshold
+
+    return [(gallery.user_ids[j] if ok else None, float(sim))
+            for j, sim, ok in zip(best, best_sims, matched)]
+
+def match_family(face_embedding, family_embeddings, threshold=0.5):
+    """정규화된 얼굴 임베딩과 가장 유사한 가족 구성원 (user_id, sim) 반환, 없으면 (None, sim)"""
+    return match_faces([face_embedding], family_embeddings, threshold)[0]
+
+def face_matches(faces, family_embeddings, threshold=0.5, one_to_one=FACE_ONE_TO_ONE):
+    """검출된 얼굴별 매칭 결과 [{'bbox', 'embedding', 'user_id', 'sim'}] (인식 결과가 없는 얼굴은 user_id=None)"""
+    results = [{"bbox": face.bbox,
+                "embedding": face.normed_embedding if face.get("embedding") is not None else None,
+                "user_id": None, "sim": -1.0} for face in faces]
+    recognized = [r for r in results if r["embedding"] is not None]
+    if recognized:
+        # InsightFace의 normed_embedding을 쌓아 한 번의 행렬 곱으로 매칭
+        embeddings = np.stack([r["embedding"] for r in recognized])
+        for r, (user_id, sim) in zip(recognized, match_faces(embeddings, family_embeddings, threshold, one_to_one)):
+            r["user_id"], r["sim"] = user_id, sim
+    return results
+
+def matched_boxes(matches):
+    """매칭 결과 중 가족 구성원과 일치하는 얼굴의 bbox 리스트"""
+    boxes = []
+    for r in matches:
+        if r["user_id"] is not None:
+            print(f"✅ 유사한 가족 구성원 탐지됨 (user_id={r['user_id']}, sim={r['sim']:.3f})")
+            boxes.append(r["bbox"])
+    return boxes
+
+def matching_boxes(faces, family_embeddings, threshold=0.5, one_to_one=FACE_ONE_TO_ONE):
+    """검출된 얼굴 중 가족 구성원과 일치하는 얼굴의 bbox 리스트"""
+    return matched_boxes(face_matches(faces, family_embeddings, threshold, one_to_one))
+
+def apply_masks(image, boxes, mask_type="black", emojis=None):
+    for bbox in boxes:
+        apply_mask(image, bbox, mask_type, emojis)
+    return image
+
+def mask_faces(image, faces, family_embeddings, mask_type="black", threshold=0.5, emojis=None):
+    """검출된 얼굴 중 가족 구성원과 일치하는 얼굴만 마스킹"""
+    return apply_masks(image, matching_boxes(faces, family_embeddings, threshold), mask_type, emojis)
+
+def mask_matching_face(image, family_embeddings, mask_type="black", threshold=0.5, emojis=None, app=None,
+                       det_size=None):
+    faces = detect_faces(image, app, det_size)
     print(f"🔍 얼굴 감지됨: {len(faces)}개")
 
     if not faces:
         return image
 
-    for face in faces:
-        if "embedding" not in face:
-            continue
+    return mask_faces(image, faces, family_embeddings, mask_type, threshold, emojis)
+
+def mask_matching_faces_batch(images, family_embeddings, mask_type="black", threshold=0.5, emojis=None,
+                              det_size=None):
+    """여러 프레임을 배치로 검출/인식한 뒤 프레임별로 마스킹"""
+    input_size = (det_size, det_size) if det_size else None
+    faces_per_frame = analyze_frames(get_face_app(), images, input_size=input_size)
+    print(f"🔍 얼굴 감지됨: {sum(len(faces) for faces in faces_per_frame)}개 ({len(images)}프레임)")
+
+    return [mask_faces(image, faces, family_embeddings, mask_type, threshold, emojis)
+            for image, faces in zip(images, faces_per_frame)]
+
+def mask_gated_face(image, family_embeddings, gate, mask_type="black", threshold=0.5, emojis=None, app=None,
+                    det_size=None):
+    """변화가 작은 프레임은 모델 없이 이전 마스크 영역 재사용 (반환: 이미지, 스킵 여부)
+
+    gate가 None이면 매 프레임 검출/인식
+    """
+    if gate is None:
+        faces = detect_faces(image, app, det_size)
+        return apply_masks(image, matching_boxes(faces, family_embeddings, threshold), mask_type, emojis), False
+    with gate.lock:
+        skipped = gate.should_skip(image)
+        if not skipped:
+            faces = detect_faces(image, app, det_size)
+            gate.update(matching_boxes(faces, family_embeddings, threshold))
+        regions = gate.regions
+    return apply_masks(image, regions, mask_type, emojis), skipped
+
+###########################
+# 얼굴 트래킹 모드 (N프레임마다 검출 + 트랙별 매칭 결과 캐시)
+###########################
+
+TRACK_DETECT_INTERVAL = 10   # 전체 얼굴 검출을 수행하는 키프레임 간격
+TRACK_VERIFY_INTERVAL = 90   # 트랙별 얼굴 인식 재검증 간격 (프레임)
+TRACK_IOU_THRESHOLD = 0.3    # 검출 결과와 기존 트랙을 같은 얼굴로 볼 IoU
+TRACK_BOX_MARGIN = 0.1       # 키프레임 사이 추적 오차를 덮기 위한 마스크 여유 비율
+TRACK_FLOW_WIDTH = 640       # 옵티컬 플로우 계산 해상도 (가로 기준)
+
+def bbox_iou(a, b):
+    """두 bbox(x_min, y_min, x_max, y_max)의 IoU"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+class FaceTrack:
+    """추적 중인 얼굴 하나 (bbox + 캐시된 가족 매칭 결과)"""
+
+    def __init__(self, track_id, bbox, frame_idx):
+        self.track_id = track_id
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+        self.user_id = None
+        self.sim = -1.0
+        self.embedding = None  # 마지막 인식 시 정규화 임베딩
+        self.last_verified = frame_idx
+
+class FaceTracker:
+    """키프레임에서만 검출/인식을 수행하고 사이 프레임은 옵티컬 플로우로 bbox를 전파"""
+
+    def __init__(self, family_embeddings, threshold=0.5,
+                 detect_interval=TRACK_DETECT_INTERVAL, verify_interval=TRACK_VERIFY_INTERVAL, det_size=None):
+        self.family_embeddings = as_gallery(family_embeddings)
+        self.threshold = threshold
+        self.det_size = (det_size, det_size) if det_size else None  # 검출 해상도 (None이면 모델 기본값)
+        self.detect_interval = max(1, detect_interval)
+        self.verify_interval = max(1, verify_interval)
+        self.tracks = []
+        self.frame_idx = 0
+        self.next_track_id = 0
+        self.prev_gray = None
+        self.stats = {"frames": 0, "detections": 0, "recognitions": 0}
+
+    def update(self, image, app=None):
+        """현재 프레임 기준으로 트랙을 갱신하고 트랙 리스트 반환 (app: 추론 풀에서 대여한 인스턴스)"""
+        gray, scale = self._flow_gray(image)
+        if self.frame_idx % self.detect_interval == 0 or self.prev_gray is None:
+            self._detect(image, app or get_face_app())
+        else:
+            self._propagate(gray, scale)
+
+        self.prev_gray = gray
+        self.frame_idx += 1
+        self.stats["frames"] += 1
+        return self.tracks
+
+    def matched_tracks(self):
+        return [t for t in self.tracks if t.user_id is not None]
+
+    def _detect(self, image, app):
+        bboxes, kpss = app.det_model.detect(image, input_size=self.det_size, max_num=0, metric="default")
+        self.stats["detections"] += 1
+
+        new_tracks = []
+        to_recognize = []
+        unmatched = list(self.tracks)
+        for i in range(bboxes.shape[0]):
+            bbox = bboxes[i, 0:4]
+            best, best_iou = None, TRACK_IOU_THRESHOLD
+            for track in unmatched:
+                iou = bbox_iou(track.bbox, bbox)
+                if iou >= best_iou:
+                    best, best_iou = track, iou
+
+            if best is None:
+                track = FaceTrack(self.next_track_id, bbox, self.frame_idx)
+                self.next_track_id += 1
+                to_recognize.append((track, i))
+            else:
+                unmatched.remove(best)
+                track = best
+                track.bbox = np.asarray(bbox, dtype=np.float32)
+                if self.frame_idx - track.last_verified >= self.verify_interval:
+                    to_recognize.append((track, i))
+            new_tracks.append(track)
+
+        # 새 트랙 / 재검증 대상 얼굴은 한 번의 배치로 인식
+        if to_recognize:
+            faces = [Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None,
+                          det_score=bboxes[i, 4]) for _, i in to_recognize]
+            embeddings = recognize_batch(app.models["recognition"],
+                                         [(image, face) for face in faces])
+            self.stats["recognitions"] += 1
+            self._verify([track for track, _ in to_recognize], embeddings)
+
+        # 키프레임에서 다시 검출되지 않은 트랙은 종료
+        self.tracks = new_tracks
+
+    def _verify(self, tracks, embeddings):
+        """인식 대상 트랙들의 임베딩을 한 번의 행렬 곱으로 가족과 매칭"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        for track, embedding, (user_id, sim) in zip(tracks, embeddings,
+                                                    match_faces(embeddings, self.family_embeddings, self.threshold)):
+            track.user_id, track.sim, track.embedding = user_id, sim, embedding
+            track.last_verified = self.frame_idx
+            if track.user_id is not None:
+                print(f"✅ 유사한 가족 구성원 탐지됨 (track={track.track_id}, user_id={track.user_id}, sim={track.sim:.3f})")
+
+    def _propagate(self, gray, scale):
+        """이전 프레임 대비 bbox 내부 특징점의 중앙 이동량만큼 트랙을 이동"""
+        for track in self.tracks:
+            x1, y1, x2, y2 = (track.bbox * scale).astype(int)
+            roi_mask = np.zeros_like(self.prev_gray)
+            roi_mask[max(0, y1):max(0, y2), max(0, x1):max(0, x2)] = 255
+            points = cv2.goodFeaturesToTrack(self.prev_gray, maxCorners=30, qualityLevel=0.01,
+                                             minDistance=3, mask=roi_mask)
+            if points is None:
+                continue
+            next_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, points, None)
+            good = status.reshape(-1) == 1
+            if not good.any():
+                continue
+            dx, dy = np.median((next_points - points).reshape(-1, 2)[good], axis=0) / scale
+            track.bbox += np.array([dx, dy, dx, dy], dtype=np.float32)
+
+    def _flow_gray(self, image):
+        h, w = image.shape[:2]
+        scale = min(1.0, TRACK_FLOW_WIDTH / w)
+        small = cv2.resize(image, (int(w * scale), int(h * scale))) if scale < 1.0 else image
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), scale
+
+def tracked_boxes(tracker):
+    """가족으로 매칭된 트랙의 bbox (추적 오차를 덮는 여유 포함)"""
+    boxes = []
+    for track in tracker.matched_tracks():
+        x_min, y_min, x_max, y_max = track.bbox
+        mx, my = (x_max - x_min) * TRACK_BOX_MARGIN, (y_max - y_min) * TRACK_BOX_MARGIN
+        boxes.append((x_min - mx, y_min - my, x_max + mx, y_max + my))
+    return boxes
+
+def mask_tracked_faces(image, tracker, mask_type="black", emojis=None):
+    """FaceTracker로 추적 중인 가족 얼굴을 마스킹 (키프레임에서만 모델 실행)"""
+    tracker.update(image)
+    return apply_masks(image, tracked_boxes(tracker), mask_type, emojis)
+
+class FrameAnalysis:
+    """프레임 한 장의 얼굴 분석 결과 (검출/인식/가족 매칭은 한 번만 하고 마스킹/신체 등 이후 단계가 공유)
+
+    faces: 얼굴별 {'bbox': (x1, y1, x2, y2), 'embedding': 정규화 임베딩 또는 None, 'user_id', 'sim'}
+    mask_boxes: 마스킹할 bbox (트래킹 여유 / 변화 감지로 재사용한 영역 포함)
+    skipped: 변화가 작아 모델 없이 이전 결과를 재사용했는지 여부
+    """
+
+    def __init__(self, frame, faces=None, mask_boxes=None, skipped=False):
+        self.frame = frame
+        self.faces = faces or []
+        self.mask_boxes = mask_boxes or []
+        self.skipped = skipped
+
+    def masked(self, mask_type="black", emojis=None):
+        """가족 얼굴 마스킹 (프레임을 직접 수정)"""
+        return apply_masks(self.frame, self.mask_boxes, mask_type, emojis)
+
+    def face_records(self):
+        """[{'bbox': [x, y, w, h], 'embedding': [...], 'user_id'}] (op_body 입력 / face JSON 형식)"""
+        records = []
+        for face in self.faces:
+            x1, y1, x2, y2 = map(int, face["bbox"])
+            embedding = face["embedding"]
+            records.append({"bbox": [x1, y1, x2 - x1, y2 - y1],
+                            "embedding": embedding.tolist() if embedding is not None else [],
+                            "user_id": face["user_id"]})
+        return records
+
+def track_faces(tracker):
+    """트래커의 현재 트랙 → FrameAnalysis.faces 형식"""
+    return [{"bbox": track.bbox, "embedding": track.embedding, "user_id": track.user_id, "sim": track.sim}
+            for track in tracker.tracks]
 
-        face_embedding = np.array(face["embedding"])
-        face_embedding = face_embedding / np.linalg.norm(face_embedding)
+def analyze_frame_stream(frames, family_embeddings, tracking=False, batch_size=FACE_BATCH_SIZE,
+                         threshold=0.5, gate=None, det_size=None):
+    """프레임 이터레이터를 받아 프레임별 FrameAnalysis를 순서대로 yield (트래킹 또는 배치 모드)
 
-        for user_id, emb in family_embeddings.items():
-            sim = np.dot(face_embedding, emb)
-            if sim >= threshold:
-                print(f"✅ 유사한 가족 구성원 탐지됨 (user_id={user_id}, sim={sim:.3f})")
+    gate(MotionGate)가 주어지면 변화가 작은 프레임은 모델 없이 이전 분석 결과를 재사용,
+    det_size가 주어지면 검출은 해당 해상도에서 하고 좌표는 원본 프레임 기준
+    tracking=True는 opt-in: TRACK_DETECT_INTERVAL 프레임마다만 검출하므로 빠르지만,
+    키프레임 사이에 새로 나타난 얼굴은 최대 TRACK_DETECT_INTERVAL-1 프레임 동안 마스킹되지 않음
+    """
+    family_embeddings = as_gallery(family_embeddings)  # 가족 행렬은 스트림 시작 시 한 번만 구성
+    faces = []
+    if tracking:
+        tracker = FaceTracker(family_embeddings, threshold, det_size=det_size)
+        for frame in frames:
+            skipped = gate is not None and gate.should_skip(frame)
+            if not skipped:
+                tracker.update(frame)
+                faces, boxes = track_faces(tracker), tracked_boxes(tracker)
+                if gate is not None:
+                    gate.update(boxes)
+            else:
+                boxes = gate.regions
+            yield FrameAnalysis(frame, faces, boxes, skipped)
+        print(f"📊 트래킹 통계: {tracker.stats}")
+        return
 
-                # 마스킹 적용
-                x_min, y_min, x_max, y_max = map(int, face["bbox"])
-                w, h = x_max - x_min, y_max - y_min
+    input_size = (det_size, det_size) if det_size else None
+    for batch in iter_batches(frames, batch_size):
+        skips = [gate is not None and gate.should_skip(frame) for frame in batch]
+        run_frames = [frame for frame, skip in zip(batch, skips) if not skip]
+        faces_per_frame = iter(analyze_frames(get_face_app(), run_frames, input_size=input_size) if run_frames else [])
 
-                if mask_type == "black":
-                    cv2.rectangle(image, (x_min, y_min), (x_max, y_max), (0, 0, 0), -1)
-                elif mask_type == "blur":
-                    face_roi = image[y_min:y_max, x_min:x_max]
-                    face_roi = cv2.GaussianBlur(face_roi, (55, 55), 30)
-                    image[y_min:y_max, x_min:x_max] = face_roi
-                elif mask_type in emojis and emojis[mask_type] is not None:
-                    emoji = cv2.resize(emojis[mask_type], (w, h))
-                    image[y_min:y_max, x_min:x_max] = emoji
+        boxes = gate.regions if gate is not None else []
+        for frame, skip in zip(batch, skips):
+            if not skip:
+                faces = face_matches(next(faces_per_frame), family_embeddings, threshold)
+                boxes = matched_boxes(faces)
+                if gate is not None:
+                    gate.update(boxes)
+            yield FrameAnalysis(frame, faces, boxes, skip)
 
-                break  # ✅ 해당 얼굴은 마스킹했으니 다음 얼굴로
+def mask_frame_stream(frames, family_embeddings, tracking=False, batch_size=FACE_BATCH_SIZE,
+                      mask_type="black", threshold=0.5, emojis=None, gate=None, det_size=None):
+    """프레임 이터레이터를 받아 마스킹된 프레임을 순서대로 yield (트래킹 또는 배치 모드)
 
-    return image
\ No newline at end of file
+    gate(MotionGate)가 주어지면 변화가 작은 프레임은 모델 없이 이전 마스크 영역을 재사용,
+    det_size가 주어지면 검출은 해당 해상도에서 하고 마스킹은 원본 프레임에 적용
+    """
+    for analysis in analyze_frame_stream(frames, family_embeddings, tracking, batch_size, threshold, gate, det_size):
+        yield analysis.masked(mask_type, emojis)
@@ -0,0 +1,221 @@
+# face_index.py
+# 여러 가족(테넌트)의 얼굴 임베딩을 대상으로 하는 신원 검색 인덱스 (정확 탐색 / IVF 근사 탐색, NumPy 구현)
+# 임베딩은 정규화된 벡터로 저장하고 유사도는 코사인(내적)으로 계산
+
+import os
+import threading
+
+import numpy as np
+
+FACE_INDEX_BACKEND = os.getenv("FACE_INDEX_BACKEND", "exact")   # exact / ivf
+IVF_NLIST = int(os.getenv("IVF_NLIST", "64"))                   # 클러스터(역색인 리스트) 수
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))                  # 검색 시 확인할 클러스터 수
+IVF_TRAIN_FACTOR = 8                                            # 클러스터당 이 수 이상 쌓이면 학습
+KMEANS_ITERATIONS = 10
+
+
+def _normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _dedupe(ids, vectors):
+    """한 번의 add에서 같은 id가 여러 번 오면 마지막 벡터만 사용"""
+    ids = list(ids)
+    last = {item_id: i for i, item_id in enumerate(ids)}
+    if len(last) == len(ids):
+        return ids, vectors
+    keep = sorted(last.values())
+    return [ids[i] for i in keep], vectors[keep]
+
+
+def _top_k(sims, k):
+    """유사도 벡터에서 큰 순서대로 k개 인덱스"""
+    k = min(k, len(sims))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-sims, k - 1)[:k]
+    return top[np.argsort(-sims[top])]
+
+
+class ExactIndex:
+    """전체 벡터와 내적을 계산하는 정확 탐색 인덱스 (id 추가/삭제 지원)"""
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.ids = []
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.positions = {}  # id → 행 번호
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.positions
+
+    def add(self, ids, vectors):
+        """벡터 추가 (이미 있는 id는 교체)"""
+        ids, vectors = _dedupe(ids, _normalize(vectors))
+        with self.lock:
+            self.remove([i for i in ids if i in self.positions])
+            for item_id in ids:
+                self.positions[item_id] = len(self.ids)
+                self.ids.append(item_id)
+            self.vectors = np.vstack([self.vectors, vectors])
+
+    def remove(self, ids):
+        """id 삭제 (마지막 행을 빈 자리로 옮겨 O(1) 삭제)"""
+        with self.lock:
+            for item_id in ids:
+                pos = self.positions.pop(item_id, None)
+                if pos is None:
+                    continue
+                last = len(self.ids) - 1
+                if pos != last:
+                    self.vectors[pos] = self.vectors[last]
+                    self.ids[pos] = self.ids[last]
+                    self.positions[self.ids[pos]] = pos
+                self.ids.pop()
+                self.vectors = self.vectors[:last]
+
+    def remove_prefix(self, prefix):
+        """prefix로 시작하는 id 전부 삭제 (예: "family_code/")"""
+        with self.lock:
+            self.remove([i for i in self.ids if str(i).startswith(prefix)])
+
+    def search(self, queries, k=1, threshold=None):
+        """쿼리별 [(id, 유사도), ...] (유사도 내림차순, threshold 미만 제외)"""
+        queries = _normalize(queries)
+        with self.lock:
+            if not self.ids:
+                return [[] for _ in queries]
+            sims = queries @ self.vectors.T
+            results = []
+            for row in sims:
+                hits = [(self.ids[j], float(row[j])) for j in _top_k(row, k)]
+                results.append([h for h in hits if threshold is None or h[1] >= threshold])
+            return results
+
+
+class IVFIndex:
+    """k-means 클러스터별 역색인 리스트에서 가까운 nprobe개 클러스터만 탐색하는 근사 인덱스
+
+    학습 전(벡터가 nlist * IVF_TRAIN_FACTOR개 미만)에는 정확 탐색과 같음
+    """
+
+    def __init__(self, dim=512, nlist=IVF_NLIST, nprobe=IVF_NPROBE):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.lists = []                  # 클러스터별 ExactIndex
+        self.pending = ExactIndex(dim)   # 학습 전 벡터
+        self.assignments = {}            # id → 클러스터 번호 (학습 후)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.pending) + sum(len(lst) for lst in self.lists)
+
+    def __contains__(self, item_id):
+        return item_id in self.assignments or item_id in self.pending
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors=None):
+        """구형(spherical) k-means로 클러스터 중심 학습 후 모든 벡터 재배치"""
+        with self.lock:
+            ids, stored = self._all_items()
+            vectors = stored if vectors is None else _normalize(vectors)
+            nlist = min(self.nlist, len(vectors))
+            if nlist == 0:
+                return
+            rng = np.random.default_rng(0)
+            centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+            for _ in range(KMEANS_ITERATIONS):
+                labels = (vectors @ centroids.T).argmax(axis=1)
+                for c in range(nlist):
+                    members = vectors[labels == c]
+                    if len(members):
+                        centroids[c] = members.sum(axis=0)
+                centroids = _normalize(centroids)
+
+            self.centroids = centroids
+            self.lists = [ExactIndex(self.dim) for _ in range(nlist)]
+            self.pending = ExactIndex(self.dim)
+            self.assignments = {}
+            if ids:
+                self._assign(ids, stored)
+            print(f"✅ IVF 인덱스 학습 완료 (벡터 {len(ids)}개, 클러스터 {nlist}개)")
+
+    def add(self, ids, vectors):
+        ids, vectors = _dedupe(ids, _normalize(vectors))
+        with self.lock:
+            self.remove([i for i in ids if i in self])
+            if not self.trained:
+                self.pending.add(ids, vectors)
+                if len(self.pending) >= self.nlist * IVF_TRAIN_FACTOR:
+                    self.train()
+                return
+            self._assign(ids, vectors)
+
+    def remove(self, ids):
+        with self.lock:
+            for item_id in ids:
+                cluster = self.assignments.pop(item_id, None)
+                if cluster is not None:
+                    self.lists[cluster].remove([item_id])
+                else:
+                    self.pending.remove([item_id])
+
+    def remove_prefix(self, prefix):
+        with self.lock:
+            self.remove([i for i in list(self.assignments) + self.pending.ids if str(i).startswith(prefix)])
+
+    def search(self, queries, k=1, threshold=None, nprobe=None):
+        queries = _normalize(queries)
+        nprobe = nprobe or self.nprobe
+        with self.lock:
+            if not self.trained:
+                return self.pending.search(queries, k, threshold)
+            probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+            results = []
+            for query, clusters in zip(queries, probes):
+                # 선택된 클러스터의 후보만 모아 한 번에 top-k
+                lists = [self.lists[c] for c in clusters if len(self.lists[c])]
+                if not lists:
+                    results.append([])
+                    continue
+                sims = np.concatenate([lst.vectors @ query for lst in lists])
+                offsets = np.cumsum([0] + [len(lst) for lst in lists])
+                hits = []
+                for j in _top_k(sims, k):
+                    n = np.searchsorted(offsets, j, side="right") - 1
+                    hits.append((lists[n].ids[j - offsets[n]], float(sims[j])))
+                results.append([h for h in hits if threshold is None or h[1] >= threshold])
+            return results
+
+    def _assign(self, ids, vectors):
+        labels = (vectors @ self.centroids.T).argmax(axis=1)
+        for c in np.unique(labels):
+            members = np.where(labels == c)[0]
+            self.lists[c].add([ids[i] for i in members], vectors[members])
+            for i in members:
+                self.assignments[ids[i]] = int(c)
+
+    def _all_items(self):
+        indexes = [self.pending] + self.lists
+        ids = [item_id for index in indexes for item_id in index.ids]
+        vectors = np.vstack([index.vectors for index in indexes]) if ids else np.zeros((0, self.dim), np.float32)
+        return ids, vectors
+
+
+def build_index(backend=FACE_INDEX_BACKEND, dim=512, **kwargs):
+    """설정된 백엔드의 빈 인덱스 생성"""
+    if backend == "exact":
+        return ExactIndex(dim)
+    if backend == "ivf":
+        return IVFIndex(dim, **kwargs)
+    raise ValueError(f"알 수 없는 인덱스 백엔드: {backend}")
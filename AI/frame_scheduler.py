@@ -0,0 +1,79 @@
+# frame_scheduler.py
+# 실시간 프레임 스케줄러: 카메라(family_code)별로 처리 중 프레임 1개 + 대기 프레임 최대 1개만 유지
+# 처리보다 빨리 들어온 프레임은 아직 시작하지 않은 대기 프레임을 대체 (최신 프레임 우선)
+# → 요청이 쌓이지 않아 지연이 추론 한 번 정도로 유지됨
+
+import asyncio
+import itertools
+
+
+class FrameDropped(Exception):
+    """더 새로운 프레임에 밀려 처리되지 않은 프레임"""
+
+    def __init__(self, frame_id, replaced_by):
+        super().__init__(f"프레임 {frame_id} 건너뜀 (최신 프레임 {replaced_by} 처리)")
+        self.frame_id = frame_id
+        self.replaced_by = replaced_by
+
+
+class _Slot:
+    def __init__(self):
+        self.pending = None      # (frame_id, 작업 함수, future, 이 프레임이 대체한 frame_id 리스트)
+        self.running = False
+
+
+class LatestFrameScheduler:
+    """key별 최신 프레임 우선 실행기 (이벤트 루프 안에서만 사용)
+
+    submit()은 처리 결과와 이 프레임이 대체한(건너뛴) frame_id 리스트를 반환하고,
+    대기 중에 더 새로운 프레임에 밀리면 FrameDropped 발생
+    처리 중/대기 프레임이 없는 key의 상태는 바로 삭제 (카메라 수만큼 상태가 쌓이지 않음)
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self.frame_ids = itertools.count(1)  # 자동 frame_id (전체 key 공통 증가값)
+        self.stats = {"submitted": 0, "processed": 0, "dropped": 0}
+
+    def next_frame_id(self):
+        return next(self.frame_ids)
+
+    async def submit(self, key, frame_id, job):
+        """job: 인자 없는 코루틴 함수 (실제 처리 시작 시점에 호출)"""
+        slot = self.slots.setdefault(key, _Slot())
+        future = asyncio.get_running_loop().create_future()
+        dropped = []
+        if slot.pending is not None:
+            # 대기 프레임을 대체: 그 프레임이 이미 대체했던 프레임까지 이 프레임의 응답으로 넘김
+            old_id, _, old_future, old_dropped = slot.pending
+            if not old_future.done():
+                old_future.set_exception(FrameDropped(old_id, frame_id))
+            dropped = old_dropped + [old_id]
+            self.stats["dropped"] += 1
+        slot.pending = (frame_id, job, future, dropped)
+        self.stats["submitted"] += 1
+
+        if not slot.running:
+            slot.running = True
+            asyncio.ensure_future(self._run(key, slot))
+        return await future
+
+    async def _run(self, key, slot):
+        """대기 프레임이 없어질 때까지 하나씩 처리"""
+        try:
+            while slot.pending is not None:
+                frame_id, job, future, dropped = slot.pending
+                slot.pending = None
+                try:
+                    result = await job()
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                self.stats["processed"] += 1
+                if not future.done():  # 요청 쪽 연결이 끊겨 취소된 경우
+                    future.set_result((result, dropped))
+        finally:
+            slot.running = False
+            if slot.pending is None and self.slots.get(key) is slot:
+                del self.slots[key]
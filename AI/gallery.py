@@ -0,0 +1,231 @@
+# gallery.py
+# family_code별 가족 임베딩 갤러리: 정규화된 float32 행렬을 .npy로 저장하고 메모리 매핑으로 공유
+# (요청마다 JSON 임베딩을 파싱/정규화하지 않고, 워커 프로세스끼리 복사 없이 같은 파일을 읽음)
+# 저장 구조: {gallery_id}.json (user_id 순서 + 현재 행렬 파일 이름) → {gallery_id}-{버전}.npy, 쓰기 잠금 {gallery_id}.lock
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from collections.abc import Mapping
+
+try:
+    import fcntl  # 프로세스 간 파일 잠금 (POSIX)
+except ImportError:
+    fcntl = None
+
+import numpy as np
+
+from wire_format import EMBEDDING_DIM, check_embedding
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GALLERY_DIR = os.getenv("GALLERY_DIR", os.path.join(BASE_DIR, "galleries"))
+GALLERY_MATRIX_TTL = int(os.getenv("GALLERY_MATRIX_TTL", "3600"))  # 교체/삭제된 행렬 파일 보관 시간 (초)
+
+_GALLERY_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def load_gallery(path):
+    """저장된 갤러리 로드 (path: 갤러리 JSON, 임베딩 행렬은 읽기 전용 메모리 매핑)"""
+    with open(path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return load_matrix(meta["user_ids"], os.path.join(os.path.dirname(path), meta["matrix"]))
+
+
+def load_matrix(user_ids, matrix_path):
+    """특정 버전의 행렬 파일로 갤러리 구성 (프로세스 풀 워커가 부모와 같은 버전을 읽도록)"""
+    return Gallery(user_ids, np.load(matrix_path, mmap_mode="r"), matrix_path)
+
+
+class Gallery(Mapping):
+    """user_id → 정규화된 임베딩 (기존 family_embeddings dict와 같은 방식으로 사용 가능)
+
+    matrix: (가족 수, EMBEDDING_DIM) float32, user_ids: 행 순서와 같은 user_id 리스트
+    matrix_path: 저장된 갤러리면 행렬 파일 경로 (파일 이름이 곧 버전)
+    """
+
+    def __init__(self, user_ids, matrix, matrix_path=None):
+        self.user_ids = list(user_ids)
+        self.matrix = matrix
+        self.matrix_path = matrix_path
+        self._index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+
+    @property
+    def version(self):
+        return os.path.basename(self.matrix_path) if self.matrix_path else None
+
+    def __getitem__(self, user_id):
+        return self.matrix[self._index[user_id]]
+
+    def __iter__(self):
+        return iter(self.user_ids)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __reduce__(self):
+        # 프로세스 풀로 넘길 때 행렬 대신 이 버전의 행렬 파일 경로만 전달 (워커에서 다시 메모리 매핑)
+        # JSON을 다시 읽지 않으므로 작업 도중 갤러리가 교체/삭제돼도 모든 세그먼트가 같은 버전을 사용
+        if self.matrix_path is not None:
+            return load_matrix, (self.user_ids, self.matrix_path)
+        return Gallery, (self.user_ids, np.asarray(self.matrix))
+
+    @classmethod
+    def from_embeddings(cls, embeddings):
+        """{user_id: 벡터} → 정규화된 갤러리 (저장하지 않음, 차원/노름이 잘못된 벡터는 ValueError)"""
+        user_ids = list(embeddings)
+        if not user_ids:
+            return cls([], np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
+        matrix = normalize_rows([check_embedding(embeddings[u]) for u in user_ids])
+        return cls(user_ids, np.ascontiguousarray(matrix))
+
+
+class GalleryStore:
+    """family_code별 갤러리 저장/조회 (파일이 바뀌면 다른 워커가 쓴 내용도 다시 매핑)
+
+    쓰기는 갤러리별 파일 잠금(fcntl) 안에서 실행하므로 여러 uvicorn 워커 프로세스가 동시에 수정해도 안전
+    """
+
+    def __init__(self, root=GALLERY_DIR):
+        self.root = root
+        self.cache = {}  # gallery_id → ((inode, 수정 시각), Gallery)
+        self.lock = threading.Lock()  # fcntl이 없는 환경에서 같은 프로세스 안의 쓰기 보호
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, gallery_id):
+        if not _GALLERY_ID.match(gallery_id or ""):
+            raise ValueError(f"잘못된 갤러리 ID: {gallery_id}")
+        return os.path.join(self.root, f"{gallery_id}.json")
+
+    @contextmanager
+    def _locked(self, gallery_id):
+        """갤러리 하나의 읽기-수정-쓰기 구간 (프로세스 간 배타 잠금)"""
+        with self.lock, open(os.path.join(self.root, f"{gallery_id}.lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def gallery_ids(self):
+        """저장된 모든 갤러리 ID"""
+        return sorted(name[:-5] for name in os.listdir(self.root) if name.endswith(".json"))
+
+    def get(self, gallery_id):
+        """갤러리 조회 (없으면 None)"""
+        path = self._path(gallery_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.cache.pop(gallery_id, None)
+            return None
+        # JSON은 항상 새 파일로 교체되므로 inode까지 비교 (같은 시각에 두 번 교체돼도 구분)
+        key = (stat.st_ino, stat.st_mtime_ns)
+
+        cached = self.cache.get(gallery_id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        try:
+            gallery = load_gallery(path)
+        except FileNotFoundError:
+            # 다른 워커가 읽는 도중 갤러리를 교체/삭제한 경우 현재 버전으로 한 번 더 시도
+            return self.get(gallery_id) if os.path.exists(path) else None
+        self.cache[gallery_id] = (key, gallery)
+        return gallery
+
+    def put(self, gallery_id, embeddings):
+        """갤러리 전체 교체 ({user_id: 벡터})
+
+        새 행렬 파일을 먼저 쓰고 JSON을 원자적으로 교체하므로 읽는 쪽은 항상 짝이 맞는 (user_ids, 행렬)을 봄
+        """
+        path = self._path(gallery_id)
+        gallery = Gallery.from_embeddings(embeddings)
+        with self._locked(gallery_id):
+            self._write(gallery_id, path, gallery)
+        return self.get(gallery_id)
+
+    def add(self, gallery_id, user_id, embedding):
+        """구성원 추가/갱신 (잠금 안에서 최신 버전을 읽어 수정하므로 동시 추가가 서로 덮어쓰지 않음)"""
+        path = self._path(gallery_id)
+        with self._locked(gallery_id):
+            embeddings = self._read(path)
+            embeddings[user_id] = np.asarray(embedding, dtype=np.float32)
+            self._write(gallery_id, path, Gallery.from_embeddings(embeddings))
+        return self.get(gallery_id)
+
+    def remove(self, gallery_id, user_id):
+        """구성원 삭제 (없는 구성원이면 KeyError)"""
+        path = self._path(gallery_id)
+        with self._locked(gallery_id):
+            embeddings = self._read(path)
+            if user_id not in embeddings:
+                raise KeyError(user_id)
+            del embeddings[user_id]
+            self._write(gallery_id, path, Gallery.from_embeddings(embeddings))
+        return self.get(gallery_id)
+
+    def delete(self, gallery_id):
+        path = self._path(gallery_id)
+        with self._locked(gallery_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._remove_stale_matrices()
+        self.cache.pop(gallery_id, None)
+
+    def _read(self, path):
+        """잠금 안에서 캐시를 거치지 않고 현재 버전을 읽음 ({user_id: 벡터}, 없으면 빈 dict)"""
+        try:
+            gallery = load_gallery(path)
+        except FileNotFoundError:
+            return {}
+        return {u: np.array(gallery[u]) for u in gallery}
+
+    def _write(self, gallery_id, path, gallery):
+        """잠금 안에서 호출: 새 버전의 행렬 파일 + JSON 저장"""
+        matrix_file = f"{gallery_id}-{uuid.uuid4().hex[:12]}.npy"
+        np.save(os.path.join(self.root, matrix_file), gallery.matrix)
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"user_ids": gallery.user_ids, "matrix": matrix_file}, f)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._remove_stale_matrices()
+        print(f"✅ 갤러리 저장: {gallery_id} ({len(gallery)}명)")
+
+    def _remove_stale_matrices(self):
+        """어느 갤러리도 가리키지 않고 GALLERY_MATRIX_TTL보다 오래된 행렬 파일 삭제
+
+        교체/삭제 직후에는 남겨 두어 진행 중인 작업(프로세스 풀 세그먼트)이 이전 버전을 계속 읽을 수 있음
+        """
+        referenced = set()
+        for gallery_id in self.gallery_ids():
+            try:
+                with open(self._path(gallery_id), "r", encoding="utf-8") as f:
+                    referenced.add(json.load(f)["matrix"])
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+        now = time.time()
+        for name in os.listdir(self.root):
+            if not name.endswith(".npy") or name in referenced:
+                continue
+            matrix_path = os.path.join(self.root, name)
+            try:
+                if now - os.stat(matrix_path).st_mtime > GALLERY_MATRIX_TTL:
+                    os.remove(matrix_path)
+            except FileNotFoundError:
+                pass  # 다른 워커가 이미 삭제
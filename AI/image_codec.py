@@ -0,0 +1,94 @@
+# image_codec.py
+# 이미지 디코딩/인코딩 계층: 검출만 필요한 경우 JPEG를 축소 해상도로 디코딩 (IMREAD_REDUCED_*, DCT 단계에서 1/2·1/4·1/8)
+# JPEG 인코딩 품질/최적화 설정, 단계별 처리 시간(Server-Timing 헤더) 측정
+
+import os
+import time
+import struct
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# ✅ 코덱 설정 (환경 변수로 변경 가능)
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "85"))            # 응답 JPEG 품질 (OpenCV 기본값 95)
+JPEG_OPTIMIZE = os.getenv("JPEG_OPTIMIZE", "0") == "1"          # 허프만 테이블 최적화 (크기↓, 인코딩 시간↑)
+DECODE_DETECT_SIDE = int(os.getenv("DECODE_DETECT_SIDE", "1280"))  # 검출/인식용 축소 디코딩 시 유지할 최소 긴 변
+
+_REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(data):
+    """JPEG 헤더(SOF)만 읽어 (width, height) 반환 (JPEG가 아니거나 헤더가 깨졌으면 None)"""
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # 채움 바이트
+            pos += 1
+            continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker in _SOF_MARKERS:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def decode(data, min_side=None):
+    """인코딩된 이미지 바이트 → (BGR 이미지, 원본 대비 배율)
+
+    min_side가 주어지고 JPEG이면 긴 변이 min_side 이상으로 남는 가장 작은 해상도(1/2, 1/4, 1/8)로 디코딩
+    (실패 시 None, 1.0)
+    """
+    buffer = np.frombuffer(data, np.uint8)
+    if min_side:
+        size = jpeg_size(data)
+        if size is not None:
+            for factor, flag in _REDUCED_FLAGS.items():
+                if max(size) / factor >= min_side:
+                    image = cv2.imdecode(buffer, flag)
+                    if image is not None:
+                        # IMREAD_REDUCED_*는 EXIF 회전을 적용하므로 SOF 가로/세로 대신 축소 배율 사용
+                        return image, 1.0 / factor
+                    break
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR), 1.0
+
+
+def encode(image, quality=None, optimize=None):
+    """BGR 이미지 → JPEG 바이트"""
+    quality = JPEG_QUALITY if quality is None else quality
+    optimize = JPEG_OPTIMIZE if optimize is None else optimize
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality,
+                                               cv2.IMWRITE_JPEG_OPTIMIZE, int(optimize)])
+    if not ok:
+        raise ValueError("🚨 JPEG 인코딩 실패")
+    return encoded.tobytes()
+
+
+class Timing:
+    """요청 단계별 처리 시간 (ms) 기록 → Server-Timing 헤더"""
+
+    def __init__(self):
+        self.durations = {}
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def header(self):
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.durations.items())
@@ -0,0 +1,73 @@
+# inference_pool.py
+# 얼굴 모델 인스턴스 풀: CPU 추론을 이벤트 루프 밖의 스레드에서 실행하고, 인스턴스를 요청마다 대여/반납
+# (onnxruntime은 추론 중 GIL을 해제하므로 한 워커에서 여러 코어를 동시에 사용 가능)
+
+import os
+import queue
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+INFERENCE_POOL_SIZE = int(os.getenv("INFERENCE_POOL_SIZE", "2"))  # 동시에 추론할 모델 인스턴스 수
+
+
+class ModelPool:
+    """factory()로 만든 모델 인스턴스를 size개 보관하고 스레드마다 하나씩 대여
+
+    first가 주어지면 첫 인스턴스는 first()로 만듦 (모델 레지스트리의 공유 인스턴스 재사용)
+    """
+
+    def __init__(self, factory, size=INFERENCE_POOL_SIZE, initial=None, first=None):
+        self.factory = factory
+        self.first = first
+        self.size = max(1, size)
+        self.instances = queue.Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="inference")
+        if initial is not None:
+            self.instances.put(initial)
+            self.created = 1
+
+    @contextmanager
+    def checkout(self):
+        """인스턴스 대여 (부족하면 size까지 새로 생성, 이후에는 반납될 때까지 대기)"""
+        instance = self._acquire()
+        try:
+            yield instance
+        finally:
+            self.instances.put(instance)
+
+    def _acquire(self):
+        try:
+            return self.instances.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                if self.first is not None:
+                    first, self.first = self.first, None
+                    return first()
+                return self.factory()
+            except Exception:
+                with self.lock:
+                    self.created -= 1
+                raise
+        return self.instances.get()
+
+    def call(self, fn, *args, **kwargs):
+        """동기 호출: fn(instance, *args, **kwargs)"""
+        with self.checkout() as instance:
+            return fn(instance, *args, **kwargs)
+
+    async def run(self, fn, *args, **kwargs):
+        """비동기 호출: 풀 스레드에서 fn(instance, *args, **kwargs) 실행"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.call(fn, *args, **kwargs))
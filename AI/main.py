@@ -1,12 +1,33 @@
 # main.py
 import os
 import uuid
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form
-from fastapi.responses import FileResponse, JSONResponse, Response
-from video_processing import extract_frames, save_video
+import asyncio
+import hmac
+import time
+import threading
+from collections import OrderedDict
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from video_processing import get_video_info, iter_frames, save_video, stream_video
+from parallel_processing import process_video_parallel, VIDEO_WORKERS, MIN_SEGMENT_FRAMES
+from motion_gate import MotionGate
+from video_jobs import VideoJobManager, JOB_EVENT_INTERVAL
+from inference_pool import ModelPool, INFERENCE_POOL_SIZE
+from streaming_ingest import MultipartStream, StreamingDecoder, INGEST_SPOOL
+from resolution_policy import get_policy
+import model_registry
+from gallery import GalleryStore
+from face_index import build_index
+from realtime_session import RealtimeSession
+from frame_scheduler import LatestFrameScheduler, FrameDropped
+import image_codec
+from image_codec import DECODE_DETECT_SIDE, Timing
+from wire_format import (EMBEDDING_ENCODING_HEADER, get_encoding, encode_embedding,
+                         decode_embedding_text, decode_family_embeddings)
 from pydantic import BaseModel
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from embedding_extractor import *
 import cv2
 import json
@@ -31,6 +52,104 @@ os.makedirs(EMBEDDING_DIR, exist_ok=True)
 
 MAX_CAPTURE = 8  # 최대 사진 수 (5장)
 
+# 🔹 비디오 마스킹 백그라운드 작업 관리자 (동시 실행 수 / 대기열 제한)
+video_jobs = VideoJobManager()
+
+# 🔹 얼굴 모델 추론 풀 (이벤트 루프 밖에서 동시 요청 처리, 첫 인스턴스는 모델 레지스트리의 공유 인스턴스 재사용)
+face_pool = ModelPool(load_face_app, INFERENCE_POOL_SIZE, first=get_face_app)
+
+# 🔹 실시간 카메라(family_code)별 변화 감지기 (이전 프레임 마스크 영역 재사용)
+#    최근 사용 순서로 보관하고 오래 쓰지 않았거나 개수를 넘으면 가장 오래된 것부터 제거
+REALTIME_GATE_TTL = float(os.getenv("REALTIME_GATE_TTL", "300"))  # 마지막 프레임 이후 유지 시간 (초)
+REALTIME_GATE_MAX = int(os.getenv("REALTIME_GATE_MAX", "1000"))   # 동시에 유지할 최대 카메라 수
+realtime_gates = OrderedDict()  # family_code → (MotionGate, 마지막 사용 시각)
+
+
+def get_realtime_gate(family_code):
+    """family_code의 변화 감지기 반환 (없으면 생성, 만료/초과된 감지기 정리 — 이벤트 루프에서만 호출)"""
+    now = time.monotonic()
+    gate, _ = realtime_gates.pop(family_code, (None, None))
+    while realtime_gates:
+        oldest, (_, last_used) = next(iter(realtime_gates.items()))
+        if now - last_used <= REALTIME_GATE_TTL and len(realtime_gates) < REALTIME_GATE_MAX:
+            break
+        del realtime_gates[oldest]
+    if gate is None:
+        gate = MotionGate()
+    realtime_gates[family_code] = (gate, now)
+    return gate
+
+# 🔹 실시간 카메라(family_code)별 최신 프레임 우선 스케줄러 (처리 중 1개 + 대기 최대 1개)
+realtime_scheduler = LatestFrameScheduler()
+
+# 🔹 family_code별 가족 임베딩 갤러리 (정규화된 행렬을 메모리 매핑으로 공유)
+galleries = GalleryStore()
+
+# 🔹 전체 가족(테넌트)의 신원 검색 인덱스 ("family_code/user_id" 단위, FACE_INDEX_BACKEND로 exact/ivf 선택)
+#    프로세스마다 메모리에 있으므로 검색 전에 저장된 갤러리 버전과 비교해 다른 워커가 쓴 변경도 반영
+identity_index = build_index()
+indexed_versions = {}  # family_code → 인덱스에 반영된 갤러리 버전 (행렬 파일 이름)
+
+# 🔹 갤러리 쓰기와 인덱스 반영을 한 번에 (동시 수정 시 인덱스가 저장된 갤러리와 어긋나지 않도록)
+gallery_lock = threading.Lock()
+
+# 🔹 family_code 없이 전체 가족을 검색하려면 필요한 관리자 토큰 (비어 있으면 전체 검색 불가)
+IDENTIFY_ADMIN_TOKEN = os.getenv("IDENTIFY_ADMIN_TOKEN", "")
+
+def index_gallery(family_code, gallery=None):
+    """family_code의 인덱스 항목을 저장된 갤러리 기준으로 다시 구성 (gallery_lock 안에서 호출)"""
+    identity_index.remove_prefix(f"{family_code}/")
+    indexed_versions.pop(family_code, None)
+    if gallery is not None and len(gallery):
+        identity_index.add([f"{family_code}/{user_id}" for user_id in gallery.user_ids], gallery.matrix)
+    if gallery is not None:
+        indexed_versions[family_code] = gallery.version
+
+def update_gallery(family_code, write, *args):
+    """동기 실행: 갤러리 쓰기 후 저장된 결과로 인덱스 갱신 (반환: write 결과)"""
+    with gallery_lock:
+        result = write(family_code, *args)
+        index_gallery(family_code, galleries.get(family_code))
+    return result
+
+def sync_identity_index():
+    """동기 실행: 저장된 갤러리 버전과 다른 가족만 인덱스 재구성 (다른 워커 프로세스의 추가/수정/삭제 반영)
+
+    갤러리 조회는 파일 stat 캐시를 거치므로 변경이 없으면 JSON/행렬을 다시 읽지 않음
+    """
+    with gallery_lock:
+        family_codes = set(galleries.gallery_ids())
+        for family_code in family_codes | set(indexed_versions):
+            try:
+                gallery = galleries.get(family_code) if family_code in family_codes else None
+                if gallery is None or gallery.version != indexed_versions.get(family_code):
+                    index_gallery(family_code, gallery)
+            except Exception as e:
+                # 손상된 갤러리 하나 때문에 서버 시작/검색이 실패하지 않도록 건너뜀
+                print(f"⚠️ 갤러리 인덱싱 건너뜀: {family_code} ({e})")
+
+def search_identity_index(embeddings, k, threshold):
+    """동기 실행: 인덱스를 저장된 갤러리와 맞춘 뒤 전체 가족 검색"""
+    sync_identity_index()
+    with gallery_lock:
+        return identity_index.search(embeddings, k, threshold)
+
+sync_identity_index()
+
+@app.on_event("startup")
+async def load_models():
+    """MODEL_PRELOAD 모델 로드/워밍업을 백그라운드에서 시작 (완료 전까지 /ready는 503)"""
+    future = asyncio.get_running_loop().run_in_executor(None, model_registry.preload)
+    future.add_done_callback(lambda f: f.exception() and print(f"🚨 모델 로드 실패: {f.exception()}"))
+
+@app.get("/ready")
+async def ready():
+    """준비 상태 확인 (오케스트레이터 readiness probe용)"""
+    models = model_registry.status()
+    if not model_registry.is_ready():
+        return JSONResponse({"status": "loading", "models": models}, status_code=503)
+    return {"status": "ready", "models": models}
+
 class RegisterFaceRequest(BaseModel):
     user_id: str
     # 파일은 List[UploadFile] 형식으로 받기
@@ -45,12 +164,105 @@ def delete_file(file_path: str):
     except Exception as e:
         print(f"🚨 파일 삭제 실패: {file_path} | {str(e)}")
 
+def mask_video_frames(video_path, normalized_embeddings, total_frames=0, tracking=False, gate=None, progress=None,
+                      det_size=None):
+    """비디오 프레임을 한 장씩 읽어 마스킹한 뒤 바로 yield 하는 제너레이터"""
+    def frames():
+        for idx, frame in enumerate(iter_frames(video_path), start=1):
+            print(f"프레임 {idx}/{total_frames} 처리 중...")
+            yield frame
+            if progress is not None:
+                progress(idx, total_frames)
+
+    # 🔹 트래킹 모드: 키프레임에서만 검출/인식 / 일반 모드: 여러 프레임을 배치로 검출/인식
+    yield from mask_frame_stream(frames(), normalized_embeddings, tracking=tracking, gate=gate, det_size=det_size)
+
+def parse_family_embeddings(family_embeddings, encoding="json") -> dict:
+    """JSON 문자열 임베딩을 파싱해 정규화 (encoding이 f16/f32면 값은 base64 문자열)"""
+    family_embeddings = decode_family_embeddings(family_embeddings, encoding)
+    return {
+        user_id: vec / np.linalg.norm(vec)
+        for user_id, vec in family_embeddings.items()
+    }
+
+def resolve_family_embeddings(family_embeddings=None, gallery_id=None, encoding="json"):
+    """gallery_id가 있으면 서버 갤러리, 없으면 요청으로 받은 임베딩 사용
+
+    갤러리가 없으면 LookupError, 둘 다 없거나 형식이 잘못되면 ValueError
+    """
+    if gallery_id:
+        gallery = galleries.get(gallery_id)
+        if gallery is None:
+            raise LookupError(f"🚨 등록된 갤러리가 없습니다: {gallery_id}")
+        return gallery
+    if family_embeddings:
+        return parse_family_embeddings(family_embeddings, get_encoding(encoding))
+    raise ValueError("🚨 family_embeddings 또는 gallery_id가 필요합니다.")
+
+def family_embeddings_error(e):
+    return JSONResponse({"error": str(e)}, status_code=404 if isinstance(e, LookupError) else 400)
+
+def run_video_masking(input_path, output_path, normalized_embeddings,
+                      tracking=False, parallel=True, motion_gating=True, progress=None, det_size=None):
+    """저장된 비디오를 마스킹해 output_path에 저장하고 스킵 통계 반환 (동기 실행)
+
+    progress(done, total)가 주어지면 처리된 프레임 수를 보고,
+    det_size가 없으면 process_video 엔드포인트 해상도 정책의 얼굴 검출 크기 사용
+    """
+    det_size = det_size or get_policy("process_video")["face_det"]
+    # 🔹 비디오 정보 확인 (프레임은 스트리밍으로 한 장씩 처리)
+    print("🎞️ [3] 비디오 정보 확인 중...")
+    video_info = get_video_info(input_path)
+    if video_info is None:
+        raise ValueError("🚨 비디오 처리 실패")
+    fps, frame_size, total_frames = video_info
+    print(f"✅ 총 {total_frames}개 프레임 (FPS: {fps}, Size: {frame_size})")
+
+    # 🔹 변화가 작은 프레임은 모델 없이 이전 마스크 영역 재사용
+    gate_stats = {"frames": 0, "skipped": 0}
+    if parallel and VIDEO_WORKERS > 1 and total_frames >= 2 * MIN_SEGMENT_FRAMES:
+        # 🔹 GOP 단위 세그먼트를 프로세스 풀에서 병렬 처리 후 무손실 병합
+        print("🧠 [4] 세그먼트 병렬 마스킹 및 비디오 저장 시작...")
+        success = process_video_parallel(
+            input_path, output_path, normalized_embeddings,
+            fps, frame_size, total_frames, tracking=tracking,
+            motion_gating=motion_gating, stats=gate_stats, progress=progress, det_size=det_size,
+        )
+    else:
+        # 🔹 프레임 추출 → 마스킹 → 인코딩을 한 프레임씩 연결 (메모리 사용량 일정)
+        print("🧠 [4] 프레임별 마스킹 및 비디오 저장 시작...")
+        gate = MotionGate() if motion_gating else None
+        masked_frames = mask_video_frames(input_path, normalized_embeddings, total_frames, tracking, gate, progress,
+                                          det_size)
+        success = save_video(masked_frames, output_path, fps, frame_size)
+        if gate is not None:
+            gate_stats = gate.stats
+    if not success:
+        raise IOError("🚨 비디오 저장 실패")
+
+    skip_rate = gate_stats["skipped"] / gate_stats["frames"] if gate_stats["frames"] else 0.0
+    print(f"✅ 모든 프레임 마스킹 및 저장 완료 (스킵 {gate_stats['skipped']}/{gate_stats['frames']}, {skip_rate:.1%})")
+    return {**gate_stats, "skip_rate": skip_rate}
+
+async def save_upload(file: UploadFile, path: str):
+    """업로드 파일을 1MB 단위로 저장 (이벤트 루프를 막지 않도록 비동기 읽기)"""
+    with open(path, "wb") as buffer:
+        while chunk := await file.read(1024 * 1024):
+            buffer.write(chunk)
+
 @app.post("/process_video/")
 async def process_video(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    family_embeddings: str = Form(...),
+    family_embeddings: Optional[str] = Form(None),
     user_id: str = Form(...),
+    gallery_id: Optional[str] = Form(None),  # 서버 갤러리 사용 시 family_embeddings 대신 전달
+    tracking: bool = Form(False),  # 트래킹은 opt-in (빠르지만 새 얼굴이 몇 프레임 마스킹되지 않을 수 있음)
+    parallel: bool = Form(True),
+    motion_gating: bool = Form(True),
+    stream_response: bool = Form(False),
+    det_size: Optional[int] = Form(None),  # 얼굴 검출 해상도 (없으면 엔드포인트 기본값)
+    x_embedding_encoding: Optional[str] = Header(None),  # json / f16 / f32 (base64)
     # mask_type: str = Form("black")
 ):
     
@@ -61,101 +273,470 @@ async def process_video(
     temp_output_path = os.path.join(LOCAL_VIDEO_DIR,  title)
 
     try:
+        print("📄 [1] 사용자 임베딩 로드 중...")
+        try:
+            normalized_embeddings = resolve_family_embeddings(family_embeddings, gallery_id, x_embedding_encoding)
+            det_size = get_policy("process_video", face_det=det_size)["face_det"]
+        except (LookupError, ValueError) as e:
+            return family_embeddings_error(e)
+
         # 🔹 업로드된 파일을 저장
-        print("📥 [1] 영상 파일 저장 중...")
-        with open(temp_input_path, "wb") as buffer:
-            while chunk := file.file.read(1024 * 1024):  # 1MB 단위로 읽기
-                buffer.write(chunk)
-
-        # 🔹 프레임 추출
-        print("🎞️ [2] 프레임 추출 중...")
-        frames, fps, frame_size = extract_frames(temp_input_path)
-        if frames is None:
-            return JSONResponse({"error": "🚨 비디오 처리 실패"}, status_code=400)
-        print(f"✅ 총 {len(frames)}개 프레임 추출 완료 (FPS: {fps}, Size: {frame_size})")
-
-
-        print("📄 [3] 사용자 임베딩 로드 중...")
-        family_embeddings = json.loads(family_embeddings)
-        normalized_embeddings = {
-            user_id: np.array(vec) / np.linalg.norm(vec)
-            for user_id, vec in family_embeddings.items()
-        }
-
-
-        print("🧠 [4] 프레임별 마스킹 처리 시작...")
-        processed_frames = []
-        for idx, frame in enumerate(frames):
-            print(f"프레임 {idx + 1}/{len(frames)} 처리 중...")
-            masked_frame = mask_matching_face(
-                frame,
-                normalized_embeddings,
-                # mask_type="black"
+        print("📥 [2] 영상 파일 저장 중...")
+        await save_upload(file, temp_input_path)
+
+        if stream_response:
+            # 🔹 fragmented MP4로 마스킹된 구간부터 바로 전송 (영상 길이와 무관한 첫 바이트 지연)
+            video_info = get_video_info(temp_input_path)
+            if video_info is None:
+                delete_file(temp_input_path)
+                return JSONResponse({"error": "🚨 비디오 처리 실패"}, status_code=400)
+            fps, frame_size, total_frames = video_info
+            print(f"📡 [3] fMP4 스트리밍 응답 시작 (FPS: {fps}, Size: {frame_size})")
+
+            gate = MotionGate() if motion_gating else None
+            masked_frames = mask_video_frames(temp_input_path, normalized_embeddings, total_frames, tracking, gate,
+                                              det_size=det_size)
+            background_tasks.add_task(delete_file, temp_input_path)
+            return StreamingResponse(
+                stream_video(masked_frames, fps, frame_size),
+                media_type="video/mp4",
+                headers={"Content-Disposition": f'inline; filename="{title}"'},
             )
-            processed_frames.append(masked_frame)
-        print("✅ 모든 프레임 마스킹 완료")
 
-        # 🔹 처리된 비디오 저장
-        print("💾 [5] 비디오 저장 중...")
-        success = save_video(processed_frames, temp_output_path, fps, frame_size)
-        if not success:
-            return JSONResponse({"error": "🚨 비디오 저장 실패"}, status_code=500)
+        # 🔹 디코딩/추론/인코딩은 스레드에서 실행 (이벤트 루프 블로킹 방지)
+        try:
+            stats = await run_in_threadpool(
+                run_video_masking, temp_input_path, temp_output_path, normalized_embeddings,
+                tracking, parallel, motion_gating, None, det_size,
+            )
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        except IOError as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
 
         background_tasks.add_task(delete_file, temp_input_path)
         background_tasks.add_task(delete_file, temp_output_path)
 
-        return FileResponse(temp_output_path, media_type="video/mp4", filename=title)
+        return FileResponse(
+            temp_output_path,
+            media_type="video/mp4",
+            filename=title,
+            headers={"X-Motion-Skip-Rate": f"{stats['skip_rate']:.4f}"},
+        )
 
     except Exception as e:
         return JSONResponse({"error": f"🚨 서버 내부 오류: {str(e)}"}, status_code=500)
 
 
+def run_stream_masking(decoder, output_path, normalized_embeddings, tracking=False, motion_gating=True,
+                       det_size=None):
+    """업로드 중인 스트림을 디코딩하면서 바로 마스킹/인코딩 (파이프 디코딩 실패 시 스풀 파일로 대체)"""
+    try:
+        header = decoder.read_header()
+        if header is None:
+            spool_path = decoder.wait_for_spool()
+            if spool_path is None:
+                raise ValueError("🚨 스트림 디코딩 실패 (faststart MP4가 필요합니다)")
+            print("⚠️ 파이프 디코딩 불가 → 저장된 파일로 처리")
+            return run_video_masking(spool_path, output_path, normalized_embeddings,
+                                     tracking, parallel=False, motion_gating=motion_gating, det_size=det_size)
+
+        fps, frame_size = header
+        print(f"🎞️ 스트림 디코딩 시작 (FPS: {fps}, Size: {frame_size})")
+
+        def frames():
+            for idx, frame in enumerate(decoder.frames(), start=1):
+                print(f"프레임 {idx} 처리 중...")
+                yield frame
+
+        gate = MotionGate() if motion_gating else None
+        masked_frames = mask_frame_stream(frames(), normalized_embeddings, tracking=tracking, gate=gate,
+                                          det_size=det_size)
+        if not save_video(masked_frames, output_path, fps, frame_size):
+            raise IOError("🚨 비디오 저장 실패")
+
+        gate_stats = gate.stats if gate is not None else {"frames": 0, "skipped": 0}
+        skip_rate = gate_stats["skipped"] / gate_stats["frames"] if gate_stats["frames"] else 0.0
+        print(f"✅ 스트림 마스킹 및 저장 완료 (스킵 {gate_stats['skipped']}/{gate_stats['frames']}, {skip_rate:.1%})")
+        return {**gate_stats, "skip_rate": skip_rate}
+    finally:
+        # 실패 시 업로드 쪽 쓰기가 막히지 않도록 ffmpeg 종료
+        decoder.close()
+
+@app.post("/process_video/stream")
+async def process_video_stream(request: Request, background_tasks: BackgroundTasks):
+    """업로드와 디코딩/마스킹을 겹쳐 실행하는 비디오 처리 경로
+
+    multipart 필드(family_embeddings 또는 gallery_id, user_id, tracking, motion_gating, det_size)는 file 파트보다 먼저 와야 함
+    """
+    job_id = uuid.uuid4().hex
+    spool_path = os.path.join(LOCAL_VIDEO_DIR, f"input_{job_id}.mp4") if INGEST_SPOOL else None
+    output_path = os.path.join(LOCAL_VIDEO_DIR, f"{job_id}_masked.mp4")
+    decoder = None
+    task = None
+
+    try:
+        reader = MultipartStream(request.headers.get("content-type", ""))
+        async for chunk in request.stream():
+            for event in reader.feed(chunk):
+                if event[0] == "file_start":
+                    fields = reader.fields
+                    if "user_id" not in fields:
+                        return JSONResponse(
+                            {"error": "🚨 family_embeddings(또는 gallery_id), user_id 필드는 파일보다 먼저 전송해야 합니다."},
+                            status_code=400,
+                        )
+                    try:
+                        normalized_embeddings = resolve_family_embeddings(
+                            fields.get("family_embeddings"), fields.get("gallery_id"),
+                            request.headers.get(EMBEDDING_ENCODING_HEADER))
+                        det_size = int(fields["det_size"]) if fields.get("det_size") else None
+                        det_size = get_policy("process_video", face_det=det_size)["face_det"]
+                    except (LookupError, ValueError) as e:
+                        return family_embeddings_error(e)
+                    print("📥 [1] 업로드 스트림 디코딩 시작...")
+                    decoder = StreamingDecoder(spool_path)
+                    task = asyncio.ensure_future(run_in_threadpool(
+                        run_stream_masking, decoder, output_path, normalized_embeddings,
+                        fields.get("tracking", "false").lower() in ("1", "true"),
+                        fields.get("motion_gating", "true").lower() != "false",
+                        det_size,
+                    ))
+                elif event[0] == "file_data":
+                    await run_in_threadpool(decoder.write, event[1])
+                elif event[0] == "file_end":
+                    await run_in_threadpool(decoder.close_input)
+
+        if task is None:
+            return JSONResponse({"error": "🚨 비디오 파일이 없습니다."}, status_code=400)
+        if not decoder.input_closed.is_set():
+            await run_in_threadpool(decoder.close_input, False)  # 파일 파트가 끝나기 전에 본문 종료 (잘린 업로드)
+
+        try:
+            stats = await task
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        except IOError as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+        background_tasks.add_task(delete_file, output_path)
+        return FileResponse(
+            output_path,
+            media_type="video/mp4",
+            filename=f"{reader.fields['user_id']}_masked.mp4",
+            headers={"X-Motion-Skip-Rate": f"{stats['skip_rate']:.4f}"},
+        )
+
+    except Exception as e:
+        delete_file(output_path)
+        return JSONResponse({"error": f"🚨 서버 내부 오류: {str(e)}"}, status_code=500)
+    finally:
+        if decoder is not None:
+            if task is not None and not task.done():
+                decoder.close()
+                await asyncio.gather(task, return_exceptions=True)
+        if spool_path:
+            delete_file(spool_path)
+
+def _run_video_job(job, input_path, output_path, normalized_embeddings, tracking, parallel, motion_gating,
+                   det_size=None):
+    """백그라운드 작업: 마스킹 실행 후 입력 파일 정리"""
+    try:
+        return run_video_masking(
+            input_path, output_path, normalized_embeddings,
+            tracking, parallel, motion_gating, progress=job.set_progress, det_size=det_size,
+        )
+    finally:
+        delete_file(input_path)
+
+@app.post("/jobs/process_video/", status_code=202)
+async def submit_video_job(
+    file: UploadFile = File(...),
+    family_embeddings: Optional[str] = Form(None),
+    user_id: str = Form(...),
+    gallery_id: Optional[str] = Form(None),
+    tracking: bool = Form(False),  # 트래킹은 opt-in (빠르지만 새 얼굴이 몇 프레임 마스킹되지 않을 수 있음)
+    parallel: bool = Form(True),
+    motion_gating: bool = Form(True),
+    det_size: Optional[int] = Form(None),
+    x_embedding_encoding: Optional[str] = Header(None),
+):
+    """비디오 마스킹 작업 등록 (job_id 즉시 반환, 처리는 백그라운드 실행기에서 진행)"""
+    if video_jobs.is_full():
+        return JSONResponse({"error": "🚨 대기 중인 작업이 너무 많습니다."}, status_code=429)
+    try:
+        normalized_embeddings = resolve_family_embeddings(family_embeddings, gallery_id, x_embedding_encoding)
+        det_size = get_policy("process_video", face_det=det_size)["face_det"]
+    except (LookupError, ValueError) as e:
+        return family_embeddings_error(e)
+
+    job_id = uuid.uuid4().hex
+    input_path = os.path.join(LOCAL_VIDEO_DIR, f"input_{job_id}.mp4")
+    output_path = os.path.join(LOCAL_VIDEO_DIR, f"{job_id}_masked.mp4")
+
+    try:
+        await save_upload(file, input_path)
+    except Exception as e:
+        delete_file(input_path)
+        return JSONResponse({"error": f"🚨 서버 내부 오류: {str(e)}"}, status_code=500)
+
+    job = video_jobs.submit(
+        _run_video_job, input_path, output_path, normalized_embeddings,
+        tracking, parallel, motion_gating, det_size,
+        job_id=job_id, output_path=output_path, filename=f"{user_id}_masked.mp4",
+    )
+    return {"job_id": job.job_id, "status": job.status}
+
+@app.get("/jobs/{job_id}")
+async def get_video_job(job_id: str):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "작업을 찾을 수 없습니다."}, status_code=404)
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def video_job_events(job_id: str):
+    """작업 상태/진행률을 Server-Sent Events로 전송 (완료 또는 실패 시 종료)"""
+    job = video_jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "작업을 찾을 수 없습니다."}, status_code=404)
+
+    async def events():
+        while True:
+            data = job.to_dict()
+            yield f"data: {json.dumps(data)}\n\n"
+            if job.finished:
+                break
+            await asyncio.sleep(JOB_EVENT_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/result")
+async def get_video_job_result(job_id: str):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "작업을 찾을 수 없습니다."}, status_code=404)
+    if job.status == "failed":
+        return JSONResponse({"error": job.error}, status_code=500)
+    if job.status != "done":
+        return JSONResponse({"error": "작업이 아직 완료되지 않았습니다.", **job.to_dict()}, status_code=409)
+
+    return FileResponse(
+        job.output_path,
+        media_type="video/mp4",
+        filename=job.filename,
+        headers={"X-Motion-Skip-Rate": f"{job.result['skip_rate']:.4f}"},
+    )
+
+
+def extract_embedding_from_bytes(face_app, image_bytes, det_size=None, timing=None):
+    """추론 풀 작업: 이미지 디코딩 후 평균 임베딩 추출 (큰 JPEG는 축소 해상도로 디코딩)"""
+    timing = timing or Timing()
+    with timing.measure("decode"):
+        image, _ = image_codec.decode(image_bytes, DECODE_DETECT_SIDE)
+    if image is None:
+        return None
+    with timing.measure("infer"):
+        return extract_faces_and_embeddings(image, face_app, det_size)
+
+def detect_face_embeddings(face_app, image_bytes, det_size=None):
+    """추론 풀 작업: 이미지의 얼굴별 (원본 좌표 bbox, 정규화 임베딩) 리스트"""
+    image, scale = image_codec.decode(image_bytes, DECODE_DETECT_SIDE)
+    if image is None:
+        return None
+    return [((face.bbox / scale).astype(int).tolist(), face.normed_embedding)
+            for face in detect_faces(image, face_app, det_size) if face.embedding is not None]
+
+def mask_frame_bytes(face_app, frame_bytes, normalized_embeddings, gate, det_size=None, timing=None):
+    """추론 풀 작업: 프레임 디코딩 → 마스킹 → JPEG 인코딩 (반환: JPEG 바이트, 스킵 여부)
+
+    마스킹 결과를 원본 해상도로 돌려줘야 하므로 디코딩은 전체 해상도, 검출 해상도는 det_size로 조절
+    """
+    timing = timing or Timing()
+    with timing.measure("decode"):
+        image, _ = image_codec.decode(frame_bytes)
+    if image is None:
+        return None
+    with timing.measure("infer"):
+        masked_frame, skipped = mask_gated_face(image, normalized_embeddings, gate, app=face_app, det_size=det_size)
+    with timing.measure("encode"):
+        encoded = image_codec.encode(masked_frame)
+    return encoded, skipped
+
+def process_session_frame(face_app, session, frame_bytes):
+    """추론 풀 작업: WebSocket 세션 프레임 마스킹 (대여한 모델 인스턴스 사용)"""
+    return session.process(frame_bytes, face_app)
+
 @app.post("/register_face/")
 async def register_face(
     user_id: str = Form(...),  # user_id는 Form으로 받기
     face_images: List[UploadFile] = File(...),  # 여러 파일을 받는 필드
+    det_size: Optional[int] = Form(None),
+    family_code: Optional[str] = Form(None),  # 주어지면 서버 갤러리에도 구성원으로 저장
+    x_embedding_encoding: Optional[str] = Header(None),  # 응답 임베딩 형식 (json / f16 / f32)
 ):
-    """새로운 얼굴 등록 경로 (임베딩만 반환)"""
+    """새로운 얼굴 등록 경로 (임베딩 반환, family_code가 있으면 갤러리에 추가)"""
     try:
-        embeddings_list = []
-        
-        for image_file in face_images:
-            image_bytes = await image_file.read()
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-            avg_embedding = extract_faces_and_embeddings(image)
-
+        encoding = get_encoding(x_embedding_encoding)
+        det_size = get_policy("register", face_det=det_size)["face_det"]
+        # 🔹 이미지별 디코딩/임베딩 추출을 추론 풀에서 동시에 실행
+        image_bytes_list = [await image_file.read() for image_file in face_images]
+        embeddings_list = await asyncio.gather(*(
+            face_pool.run(extract_embedding_from_bytes, image_bytes, det_size)
+            for image_bytes in image_bytes_list
+        ))
+
+        for avg_embedding in embeddings_list:
             if avg_embedding is None:
                 return JSONResponse({"error": "🚨 얼굴 임베딩 추출 실패"}, status_code=400)
 
+        if family_code:
+            await run_in_threadpool(update_gallery, family_code, galleries.add, user_id, avg_embedding)
 
         return JSONResponse({
             "message": "✅ 얼굴 등록 완료!",
-            "embedding": avg_embedding
-        }, status_code=200)
+            "embedding": encode_embedding(avg_embedding, encoding)
+        }, status_code=200, headers={EMBEDDING_ENCODING_HEADER: encoding})
 
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
     except Exception as e:
         return JSONResponse({"error": f"🚨 서버 내부 오류: {str(e)}"}, status_code=500)
 
 
+@app.put("/galleries/{family_code}")
+async def put_gallery(family_code: str, family_embeddings: str = Form(...),
+                      x_embedding_encoding: Optional[str] = Header(None)):
+    """가족 임베딩 갤러리 전체 등록/교체 (family_embeddings: {user_id: 임베딩} JSON)"""
+    try:
+        embeddings = decode_family_embeddings(family_embeddings, get_encoding(x_embedding_encoding))
+        gallery = await run_in_threadpool(update_gallery, family_code, galleries.put, embeddings)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return {"family_code": family_code, "user_ids": gallery.user_ids}
+
+@app.get("/galleries/{family_code}")
+async def get_gallery(family_code: str):
+    try:
+        gallery = galleries.get(family_code)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if gallery is None:
+        return JSONResponse({"error": "갤러리를 찾을 수 없습니다."}, status_code=404)
+    return {"family_code": family_code, "user_ids": gallery.user_ids}
+
+@app.post("/galleries/{family_code}/members")
+async def add_gallery_member(family_code: str, user_id: str = Form(...), embedding: str = Form(...),
+                             x_embedding_encoding: Optional[str] = Header(None)):
+    """구성원 임베딩 추가/갱신 (embedding: JSON 리스트 또는 base64)"""
+    try:
+        embedding = decode_embedding_text(embedding, get_encoding(x_embedding_encoding))
+        gallery = await run_in_threadpool(update_gallery, family_code, galleries.add, user_id, embedding)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return {"family_code": family_code, "user_ids": gallery.user_ids}
+
+@app.delete("/galleries/{family_code}/members/{user_id}")
+async def remove_gallery_member(family_code: str, user_id: str):
+    try:
+        gallery = await run_in_threadpool(update_gallery, family_code, galleries.remove, user_id)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except KeyError:
+        return JSONResponse({"error": "구성원을 찾을 수 없습니다."}, status_code=404)
+    return {"family_code": family_code, "user_ids": gallery.user_ids}
+
+@app.delete("/galleries/{family_code}")
+async def delete_gallery(family_code: str):
+    try:
+        await run_in_threadpool(update_gallery, family_code, galleries.delete)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    realtime_gates.pop(family_code, None)
+    return {"family_code": family_code, "deleted": True}
+
+
+@app.post("/identify/")
+async def identify_faces(
+    file: UploadFile = File(...),
+    k: int = Form(5),
+    threshold: float = Form(0.5),
+    family_code: Optional[str] = Form(None),  # 해당 가족 구성원 중에서만 검색
+    x_admin_token: Optional[str] = Header(None),  # family_code 없이 전체 가족을 검색할 때만 필요
+):
+    """사진 속 얼굴별로 가장 유사한 등록 신원 top-k 검색
+
+    family_code가 있으면 그 가족 갤러리에서만 검색, 없으면 관리자 토큰이 있을 때만 전체 인덱스 검색
+    """
+    if not family_code and not (IDENTIFY_ADMIN_TOKEN and x_admin_token
+                                and hmac.compare_digest(x_admin_token, IDENTIFY_ADMIN_TOKEN)):
+        return JSONResponse({"error": "🚨 family_code가 필요합니다."}, status_code=403)
+    try:
+        gallery = galleries.get(family_code) if family_code else None
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if family_code and gallery is None:
+        return JSONResponse({"error": "갤러리를 찾을 수 없습니다."}, status_code=404)
+
+    try:
+        contents = await file.read()
+        det_size = get_policy("register")["face_det"]
+        faces = await face_pool.run(detect_face_embeddings, contents, det_size)
+        if faces is None:
+            return JSONResponse({"error": "Invalid image format"}, status_code=400)
+        if not faces:
+            return {"faces": []}
+
+        embeddings = np.stack([emb for _, emb in faces])
+        results = []
+        if gallery is not None:
+            # 가족 범위 검색: 가족 행렬과 직접 비교 (다른 가족 신원은 보지 않음)
+            sims = embeddings @ np.asarray(gallery.matrix).T
+            for (bbox, _), row in zip(faces, sims):
+                matches = [{"family_code": family_code, "user_id": gallery.user_ids[j], "similarity": float(row[j])}
+                           for j in np.argsort(-row)[:k] if row[j] >= threshold]
+                results.append({"bbox": bbox, "matches": matches})
+            return {"faces": results}
+
+        hits = await run_in_threadpool(search_identity_index, embeddings, k, threshold)
+        for (bbox, _), face_hits in zip(faces, hits):
+            matches = []
+            for identity, sim in face_hits:
+                code, user_id = identity.split("/", 1)
+                matches.append({"family_code": code, "user_id": user_id, "similarity": sim})
+            results.append({"bbox": bbox, "matches": matches})
+        return {"faces": results}
+
+    except Exception as e:
+        return JSONResponse({"error": f"🚨 서버 오류: {str(e)}"}, status_code=500)
+
+
 @app.post("/check_similarity/")
 async def check_similarity(
     file: UploadFile = File(...),
     embedding: str = Form(...),
+    det_size: Optional[int] = Form(None),
+    x_embedding_encoding: Optional[str] = Header(None),  # embedding 형식 (json / f16 / f32)
 ):
     try:
+        try:
+            det_size = get_policy("register", face_det=det_size)["face_det"]
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
         # 🔹 업로드된 이미지 읽기
         contents = await file.read()
-        np_arr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
 
         # 🔹 업로드된 임베딩 파싱 및 정규화
-        target_embedding = np.array(json.loads(embedding))
+        try:
+            target_embedding = decode_embedding_text(embedding, get_encoding(x_embedding_encoding))
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
         target_embedding = target_embedding / np.linalg.norm(target_embedding)
 
-        # 🔹 얼굴 인식 및 임베딩 추출 (평균)
-        extracted_embedding = extract_faces_and_embeddings(image)
+        # 🔹 얼굴 인식 및 임베딩 추출 (평균, 추론 풀에서 실행)
+        timing = Timing()
+        extracted_embedding = await face_pool.run(extract_embedding_from_bytes, contents, det_size, timing)
         if extracted_embedding is None:
             return JSONResponse({"error": "얼굴을 감지하지 못했습니다."}, status_code=400)
 
@@ -166,7 +747,7 @@ async def check_similarity(
         similarity = float(np.dot(extracted_embedding, target_embedding))
         print(f"🔍 유사도 계산됨: {similarity:.4f}")
 
-        return {"similarity": similarity}
+        return JSONResponse({"similarity": similarity}, headers={"Server-Timing": timing.header()})
 
     except Exception as e:
         return JSONResponse({"error": f"🚨 서버 오류: {str(e)}"}, status_code=500)
@@ -176,37 +757,140 @@ async def check_similarity(
 async def receive_and_return_masked_frame(
     family_code: str = Form(...),
     frame: UploadFile = File(...),
-    family_embeddings: str = Form(...)
+    family_embeddings: Optional[str] = Form(None),  # 없으면 family_code 갤러리 사용
+    det_size: Optional[int] = Form(None),  # 얼굴 검출 해상도 (없으면 실시간 기본값)
+    x_embedding_encoding: Optional[str] = Header(None),  # family_embeddings 형식 (json / f16 / f32)
+    frame_id: Optional[int] = Form(None),  # 클라이언트 프레임 번호 (없으면 서버에서 순번 부여)
 ):
     try:
         # 1. 프레임 로딩
         frame_bytes = await frame.read()
-        nparr = np.frombuffer(frame_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if image is None:
-            return JSONResponse(status_code=400, content={"error": "Invalid image format"})
 
-        # 2. 임베딩 로드 및 정규화
-        family_embeddings = json.loads(family_embeddings)
-        normalized_embeddings = {
-            user_id: np.array(vec) / np.linalg.norm(vec)
-            for user_id, vec in family_embeddings.items()
-        }
-
-        # 3. 마스킹 처리
-        masked_frame = mask_matching_face(image, normalized_embeddings)
+        # 2. 임베딩 로드 (갤러리는 정규화된 행렬을 그대로 사용, 요청 임베딩은 디코딩 후 정규화)
+        try:
+            normalized_embeddings = resolve_family_embeddings(
+                family_embeddings, None if family_embeddings else family_code, x_embedding_encoding)
+        except (LookupError, ValueError) as e:
+            return family_embeddings_error(e)
+
+        # 3. 디코딩 → 마스킹 → JPEG 인코딩을 추론 풀에서 실행 (변화가 작은 프레임은 이전 마스크 영역 재사용)
+        #    처리 중인 프레임이 있으면 대기하고, 그 사이 더 새 프레임이 오면 이 프레임은 건너뜀
+        try:
+            det_size = get_policy("realtime", face_det=det_size)["face_det"]
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        gate = get_realtime_gate(family_code)
+        if frame_id is None:
+            frame_id = realtime_scheduler.next_frame_id()
+        timing = Timing()
+        try:
+            result, dropped = await realtime_scheduler.submit(family_code, frame_id, lambda: face_pool.run(
+                mask_frame_bytes, frame_bytes, normalized_embeddings, gate, det_size, timing))
+        except FrameDropped as e:
+            return JSONResponse(
+                {"error": str(e), "frame_id": e.frame_id, "replaced_by": e.replaced_by},
+                status_code=409,
+                headers={"X-Frame-Id": str(e.frame_id), "X-Frame-Dropped": "1"},
+            )
+        if result is None:
+            return JSONResponse(status_code=400, content={"error": "Invalid image format"})
+        encoded, skipped = result
 
-        # 4. JPEG로 인코딩 후 바이너리 응답
-        _, encoded = cv2.imencode('.jpg', masked_frame)
+        # 4. 바이너리 응답
         return Response(
-            content=encoded.tobytes(),
+            content=encoded,
             media_type="image/jpeg",
-            headers={"X-Family-Code": family_code}
+            headers={
+                "X-Family-Code": family_code,
+                "X-Frame-Id": str(frame_id),
+                "X-Dropped-Frames": ",".join(map(str, dropped)),  # 이 프레임 대기 중 건너뛴 이전 프레임들
+                "X-Frame-Skipped": "1" if skipped else "0",
+                "X-Motion-Skip-Rate": f"{gate.skip_rate:.4f}",
+                "Server-Timing": timing.header(),  # decode / infer / encode (ms)
+            }
         )
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
-    
+
+
+@app.websocket("/realtime/stream")
+async def realtime_stream(websocket: WebSocket):
+    """카메라 연결 하나를 유지하며 바이너리 JPEG 프레임을 받아 마스킹된 JPEG 프레임으로 응답
+
+    쿼리: family_code(필수), det_size, tracking(기본 0), motion_gating(기본 1), embedding_encoding(json / f16 / f32)
+    텍스트 메시지 {"family_embeddings": {...}}로 가족 임베딩 지정/교체 (없으면 family_code 갤러리 사용)
+    오류와 상태는 텍스트(JSON) 메시지로 전송
+    """
+    await websocket.accept()
+    params = websocket.query_params
+    family_code = params.get("family_code")
+    if not family_code:
+        await websocket.send_json({"error": "🚨 family_code가 필요합니다."})
+        await websocket.close(code=1008)
+        return
+
+    try:
+        det_size = int(params["det_size"]) if params.get("det_size") else None
+        det_size = get_policy("realtime", face_det=det_size)["face_det"]
+    except ValueError as e:
+        await websocket.send_json({"error": f"🚨 잘못된 det_size: {e}"})
+        await websocket.close(code=1008)
+        return
+    tracking = params.get("tracking", "0") in ("1", "true")
+    motion_gating = params.get("motion_gating", "1") not in ("0", "false")
+    session = None
+    try:
+        gallery = galleries.get(family_code)
+    except ValueError as e:
+        await websocket.send_json({"error": str(e)})
+        await websocket.close(code=1008)
+        return
+    if gallery is not None:
+        session = RealtimeSession(family_code, gallery, det_size, tracking, motion_gating)
+        await websocket.send_json({"status": "ready", "family_code": family_code, "members": len(gallery)})
+    print(f"📡 실시간 스트림 연결: {family_code}")
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("text") is not None:
+                # 🔹 가족 임베딩 지정/교체 (연결 동안 한 번만 파싱/정규화)
+                try:
+                    config = json.loads(message["text"])
+                    family = parse_family_embeddings(
+                        config["family_embeddings"],
+                        get_encoding(config.get("encoding", params.get("embedding_encoding"))))
+                except (KeyError, TypeError, AttributeError, ValueError) as e:
+                    await websocket.send_json({"error": f"🚨 잘못된 설정 메시지: {e}"})
+                    continue
+                if session is None:
+                    session = RealtimeSession(family_code, family, det_size, tracking, motion_gating)
+                else:
+                    session.set_family(family)
+                await websocket.send_json({"status": "ready", "family_code": family_code, "members": len(family)})
+                continue
+
+            if session is None:
+                await websocket.send_json({"error": "🚨 등록된 갤러리가 없습니다. family_embeddings를 먼저 보내주세요."})
+                continue
+
+            # 🔹 디코딩 → 마스킹 → 인코딩은 추론 풀에서 (같은 연결의 프레임은 순서대로 처리)
+            result = await face_pool.run(process_session_frame, session, message["bytes"])
+            if result is None:
+                await websocket.send_json({"error": "Invalid image format"})
+                continue
+            await websocket.send_bytes(result[0])
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if session is not None:
+            print(f"📊 실시간 스트림 종료: {family_code} {session.summary()}")
+
 
 @app.post("/upload/masked/")
 async def upload_masked_video(file: UploadFile = File(...)):
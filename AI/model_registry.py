@@ -0,0 +1,125 @@
+# model_registry.py
+# 무거운 모델(ArcFace / YOLOv8 / TFLite 세그멘테이션 / MediaPipe Pose)을 프로세스당 하나씩만 로드하는 중앙 레지스트리
+# (모듈 import 시점이 아니라 처음 사용할 때 또는 시작 시 preload로 로드)
+
+import os
+import threading
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "model")
+
+# ✅ 시작 시 미리 로드할 모델 ("all", 쉼표 구분 이름 목록, 빈 값이면 전부 지연 로드)
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "face")
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"  # 로드 직후 더미 프레임으로 추론 1회 실행
+
+_loaders = {}    # 이름 → (loader, warmup)
+_instances = {}  # 이름 → 로드된 모델
+_locks = {}      # 이름별 로드 잠금 (같은 모델을 두 번 로드하지 않도록)
+_registry_lock = threading.Lock()
+_ready = threading.Event()
+
+
+def register(name, loader, warmup=None):
+    """모델 로더 등록 (loader() → 모델, warmup(model) → 더미 추론)"""
+    with _registry_lock:
+        _loaders[name] = (loader, warmup)
+        _locks.setdefault(name, threading.Lock())
+
+
+def get(name):
+    """공유 모델 인스턴스 반환 (처음 호출 시 로드)"""
+    model = _instances.get(name)
+    if model is not None:
+        return model
+    if name not in _loaders:
+        raise KeyError(f"등록되지 않은 모델: {name}")
+
+    with _locks[name]:
+        if name not in _instances:
+            loader, _ = _loaders[name]
+            print(f"🔹 모델 로드 중: {name}")
+            _instances[name] = loader()
+            print(f"✅ 모델 로드 완료: {name}")
+        return _instances[name]
+
+
+def is_loaded(name):
+    return name in _instances
+
+
+def warm_up(names=None):
+    """더미 프레임으로 추론을 한 번 실행해 onnxruntime/TFLite의 지연 초기화 비용을 미리 지불"""
+    for name in names or list(_instances):
+        _, warmup = _loaders[name]
+        if warmup is not None:
+            warmup(get(name))
+            print(f"🔥 워밍업 완료: {name}")
+
+
+def preload(names=None):
+    """MODEL_PRELOAD(또는 names)에 지정된 모델을 로드/워밍업하고 준비 완료로 표시"""
+    if names is None:
+        names = list(_loaders) if MODEL_PRELOAD == "all" else [n.strip() for n in MODEL_PRELOAD.split(",") if n.strip()]
+    for name in names:
+        get(name)
+    if MODEL_WARMUP:
+        warm_up(names)
+    _ready.set()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def status():
+    return {name: name in _instances for name in _loaders}
+
+
+###########################
+# 기본 모델 로더 (무거운 라이브러리는 로더 안에서 import)
+###########################
+
+def _load_face():
+    from embedding_extractor import load_face_app
+    return load_face_app()
+
+def _warmup_face(app):
+    dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+    app.det_model.detect(dummy, max_num=0, metric="default")
+    if "recognition" in app.models:
+        rec_model = app.models["recognition"]
+        rec_model.get_feat([np.zeros((rec_model.input_size[1], rec_model.input_size[0], 3), dtype=np.uint8)])
+
+def _load_yolo():
+    from ultralytics import YOLO
+    return YOLO(os.path.join(MODEL_DIR, "yolov8s.pt"))
+
+def _warmup_yolo(model):
+    model.predict(np.zeros((640, 640, 3), dtype=np.uint8), conf=0.5, verbose=False)
+
+def _load_segmenter():
+    # 인터프리터 풀 (SEG_POOL_SIZE / SEG_NUM_THREADS / SEG_XNNPACK)
+    from segmentation import SegmentationEngine
+    return SegmentationEngine()
+
+def _warmup_segmenter(engine):
+    engine.warm_up()
+
+def _load_pose():
+    import mediapipe as mp
+    return mp.solutions.pose.Pose(
+        static_image_mode=True,
+        model_complexity=2,
+        enable_segmentation=False,
+        min_detection_confidence=0.5
+    )
+
+def _warmup_pose(pose):
+    pose.process(np.zeros((256, 256, 3), dtype=np.uint8))
+
+register("face", _load_face, _warmup_face)
+register("yolo", _load_yolo, _warmup_yolo)
+register("segmenter", _load_segmenter, _warmup_segmenter)
+register("pose", _load_pose, _warmup_pose)
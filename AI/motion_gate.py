@@ -0,0 +1,60 @@
+# motion_gate.py
+# 고정 홈캠 영상에서 변화가 거의 없는 프레임은 모델 실행 없이 이전 마스크 영역을 재사용하기 위한 변화 감지기
+
+import os
+import threading
+import cv2
+import numpy as np
+
+# ✅ 변화 감지 설정 (환경 변수로 변경 가능)
+MOTION_GATE_WIDTH = 160                                               # 비교용 축소 해상도 (가로 기준)
+MOTION_PIXEL_DIFF = 15                                                # 변화로 볼 픽셀 밝기 차이
+MOTION_CHANGE_RATIO = float(os.getenv("MOTION_CHANGE_RATIO", "0.005"))  # 변화 픽셀 비율이 이 값 미만이면 스킵
+MOTION_MAX_SKIP = int(os.getenv("MOTION_MAX_SKIP", "30"))             # 연속 스킵 최대 프레임 수 (주기적 재검출)
+
+
+class MotionGate:
+    """마지막으로 모델을 실행한 프레임과 비교해 변화가 작으면 스킵 여부를 알려주는 클래스"""
+
+    def __init__(self, change_ratio=MOTION_CHANGE_RATIO, max_skip=MOTION_MAX_SKIP):
+        self.change_ratio = change_ratio
+        self.max_skip = max_skip
+        self.reference = None   # 마지막으로 모델을 실행한 프레임 (축소 흑백)
+        self.regions = []       # 마지막으로 계산된 마스크 영역 bbox 리스트
+        self.consecutive_skips = 0
+        self.stats = {"frames": 0, "skipped": 0}
+        self.lock = threading.Lock()  # 같은 카메라의 동시 요청 보호
+
+    def should_skip(self, frame):
+        """변화가 임계값 미만이면 True (모델 실행 생략), 아니면 기준 프레임을 갱신하고 False"""
+        small = self._preprocess(frame)
+        self.stats["frames"] += 1
+
+        if (self.reference is not None
+                and self.reference.shape == small.shape
+                and self.consecutive_skips < self.max_skip):
+            changed = np.count_nonzero(cv2.absdiff(small, self.reference) > MOTION_PIXEL_DIFF)
+            if changed / small.size < self.change_ratio:
+                self.consecutive_skips += 1
+                self.stats["skipped"] += 1
+                return True
+
+        self.reference = small
+        self.consecutive_skips = 0
+        return False
+
+    def update(self, regions):
+        """모델을 실행한 프레임의 마스크 영역 저장"""
+        self.regions = list(regions)
+
+    @property
+    def skip_rate(self):
+        return self.stats["skipped"] / self.stats["frames"] if self.stats["frames"] else 0.0
+
+    def _preprocess(self, frame):
+        h, w = frame.shape[:2]
+        scale = min(1.0, MOTION_GATE_WIDTH / w)
+        small = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)  # 센서 노이즈 제거
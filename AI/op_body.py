@@ -2,27 +2,10 @@ import os
 import cv2
 import json
 import numpy as np
-import tensorflow as tf
-import mediapipe as mp
-from ultralytics import YOLO
-
-# 경로 및 모델 초기화
-BASE_DIR = os.path.dirname(__file__)
-YOLO_MODEL = YOLO(os.path.join(BASE_DIR, "model", "yolov8s.pt"))
-
-# TFLite 세그멘테이션 초기화
-TFLITE = tf.lite.Interpreter(model_path=os.path.join(BASE_DIR, "model", "2.tflite"))
-TFLITE.allocate_tensors()
-_IN = TFLITE.get_input_details()[0]
-_OUT = TFLITE.get_output_details()[0]
-
-# MediaPipe Pose 초기화
-POSE = mp.solutions.pose.Pose(
-    static_image_mode=True,
-    model_complexity=2,
-    enable_segmentation=False,
-    min_detection_confidence=0.5
-)
+import model_registry
+from resolution_policy import downscale, get_policy
+
+# YOLOv8 / TFLite 세그멘테이션 / MediaPipe Pose는 모델 레지스트리에서 공유 (처음 사용할 때 로드)
 
 # 파라미터
 RADIUS = 20
@@ -56,13 +39,8 @@ def repeated_blur(img: np.ndarray, coords: list[tuple], padding: int = MASK_PADD
 
 # 프레임 처리 함수
 def segment_frame(frame: np.ndarray) -> np.ndarray:
-    h, w = frame.shape[:2]
-    ih, iw = _IN['shape'][1:3]
-    inp = cv2.resize(frame, (iw, ih)).astype(np.float32) / 255.0
-    TFLITE.set_tensor(_IN['index'], inp[np.newaxis])
-    TFLITE.invoke()
-    seg = TFLITE.get_tensor(_OUT['index'])[0]
-    return cv2.resize(np.argmax(seg, -1).astype(np.uint8), (w, h), interpolation=cv2.INTER_NEAREST)
+    # 세그멘테이션 엔진의 인터프리터 풀에서 하나를 대여해 추론 (클래스 맵은 프레임 해상도로 복원)
+    return model_registry.get("segmenter").segment(frame)
 
 def get_skin_mask(frame: np.ndarray, seg_map: np.ndarray) -> np.ndarray:
     hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
@@ -70,18 +48,22 @@ def get_skin_mask(frame: np.ndarray, seg_map: np.ndarray) -> np.ndarray:
     person_mask = (seg_map > 0).astype(np.uint8) * 255
     return cv2.bitwise_and(skin, person_mask)
 
-def detect_persons(frame: np.ndarray) -> list[tuple]:
-    res = YOLO_MODEL.predict(frame, conf=0.5)[0]
+def detect_persons(frame: np.ndarray, imgsz: int = 640) -> list[tuple]:
+    # YOLO는 imgsz로 축소해 추론하고 bbox는 원본 좌표로 반환
+    res = model_registry.get("yolo").predict(frame, conf=0.5, imgsz=imgsz)[0]
     return [tuple(map(int, box.xyxy[0].tolist()))
             for box in res.boxes if int(box.cls[0]) == 0]
 
-def extract_landmarks(frame: np.ndarray, bboxes: list[tuple]) -> tuple[list[dict], list[tuple]]:
+def extract_landmarks(frame: np.ndarray, bboxes: list[tuple], max_side: int = None) -> tuple[list[dict], list[tuple]]:
     lm_list, bb_list = [], []
+    pose = model_registry.get("pose")
     for x1, y1, x2, y2 in bboxes:
         crop = frame[y1:y2, x1:x2]
         if crop.size == 0:
             continue
-        res = POSE.process(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+        # Pose 입력만 축소 (랜드마크는 정규화 좌표라 원본 crop 크기로 복원)
+        pose_input, _ = downscale(crop, max_side)
+        res = pose.process(cv2.cvtColor(pose_input, cv2.COLOR_BGR2RGB))
         if not res.pose_landmarks:
             continue
         pts = {}
@@ -94,36 +76,50 @@ def extract_landmarks(frame: np.ndarray, bboxes: list[tuple]) -> tuple[list[dict
 
 # 노출 판정: 얼굴 랜드마크(0~10) 제외
 
-def evaluate_exposure(pts: dict, skin_mask: np.ndarray) -> list[int]:
-    yy, xx = np.ogrid[-RADIUS:RADIUS+1, -RADIUS:RADIUS+1]
-    circle = (xx**2 + yy**2) <= RADIUS**2
+def evaluate_exposure(pts: dict, skin_mask: np.ndarray, scale: float = 1.0) -> list[int]:
+    """scale: 원본 대비 skin_mask 해상도 비율 (랜드마크 좌표와 반경을 마스크 해상도로 변환)"""
+    radius = max(1, int(round(RADIUS * scale)))
+    yy, xx = np.ogrid[-radius:radius+1, -radius:radius+1]
+    circle = (xx**2 + yy**2) <= radius**2
     exposed_ids = []
     # 얼굴 ID 제외
     for pid in set(pts.keys()) - FACE_IDS:
-        x, y = pts[pid]['x'], pts[pid]['y']
-        reg = skin_mask[max(0, y-RADIUS):y+RADIUS+1,
-                        max(0, x-RADIUS):x+RADIUS+1]
+        x, y = int(pts[pid]['x'] * scale), int(pts[pid]['y'] * scale)
+        reg = skin_mask[max(0, y-radius):y+radius+1,
+                        max(0, x-radius):x+radius+1]
         mask = circle[:reg.shape[0], :reg.shape[1]]
         if mask.sum() > 0 and (reg[mask] > 0).sum() / mask.sum() >= EXPOSURE_THRESHOLD:
             exposed_ids.append(pid)
     return exposed_ids
 
 # 통합 파이프라인
-def process_image(image_path: str, face_json: str, output_dir: str) -> tuple[str, np.ndarray]:
-    os.makedirs(output_dir, exist_ok=True)
-    frame = cv2.imread(image_path)
-    seg_map = segment_frame(frame)
-    skin_mask = get_skin_mask(frame, seg_map)
-
-    # 얼굴 bbox 로드
-    faces = load_json(face_json)
-    face_bb = None
-    if faces:
-        x, y, w, h = faces[0]['bbox']
-        face_bb = (x, y, x + w, y + h)
-
-    persons = detect_persons(frame)
-    lm_list, bb_list = extract_landmarks(frame, persons)
+def face_box(faces: list[dict]):
+    """가족으로 매칭되지 않은 첫 번째 얼굴 bbox([x, y, w, h]) → (x1, y1, x2, y2) (없으면 None)
+
+    가족 얼굴은 이미 마스킹되므로 제외 (user_id가 없는 얼굴 JSON은 모두 대상)
+    """
+    unmatched = [f for f in faces if f.get('user_id') is None]
+    if not unmatched:
+        return None
+    x, y, w, h = unmatched[0]['bbox']
+    return (x, y, x + w, y + h)
+
+def process_frame(frame: np.ndarray, faces: list[dict], output_dir: str = None,
+                  policy=None) -> tuple[np.ndarray, list[dict]]:
+    """디코딩된 프레임과 얼굴 검출 결과로 노출 부위 블러 (반환: 블러된 프레임, 사람별 결과)
+
+    faces: [{'bbox': [x, y, w, h], ...}], output_dir가 주어질 때만 landmarks.json / masked.jpg 저장
+    """
+    policy = policy or get_policy("op")
+
+    # 세그멘테이션/피부 마스크는 작업 해상도에서 계산 (블러는 원본 해상도에 적용)
+    small, scale = policy.downscale(frame, "skin")
+    seg_map = segment_frame(small)
+    skin_mask = get_skin_mask(small, seg_map)
+
+    face_bb = face_box(faces)
+    persons = detect_persons(frame, imgsz=policy["person_det"])
+    lm_list, bb_list = extract_landmarks(frame, persons, max_side=policy["pose"])
 
     results = []
     blur_img = frame.copy()
@@ -131,15 +127,20 @@ def process_image(image_path: str, face_json: str, output_dir: str) -> tuple[str
         # 얼굴 프레임 제외
         if face_bb and not (bb[0] <= face_bb[0] <= bb[2] and bb[1] <= face_bb[1] <= bb[3]):
             continue
-        exposed_ids = evaluate_exposure(pts, skin_mask)
+        exposed_ids = evaluate_exposure(pts, skin_mask, scale)
         coords = [(pts[i]['x'], pts[i]['y']) for i in exposed_ids]
         if coords:
             blur_img = repeated_blur(blur_img, coords)
         results.append({'bbox': bb, 'exposed': exposed_ids})
 
-    # 저장
-    json_path = os.path.join(output_dir, 'landmarks.json')
-    save_json(json_path, results)
-    masked_path = os.path.join(output_dir, 'masked.jpg')
-    cv2.imwrite(masked_path, blur_img)
-    return json_path, blur_img
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        save_json(os.path.join(output_dir, 'landmarks.json'), results)
+        cv2.imwrite(os.path.join(output_dir, 'masked.jpg'), blur_img)
+    return blur_img, results
+
+def process_image(image_path: str, face_json: str, output_dir: str, policy=None) -> tuple[str, np.ndarray]:
+    """파일 기반 파이프라인 (이미지 + 얼굴 JSON 경로 → landmarks.json 경로, 블러된 프레임)"""
+    frame = cv2.imread(image_path)
+    blur_img, _ = process_frame(frame, load_json(face_json), output_dir, policy)
+    return os.path.join(output_dir, 'landmarks.json'), blur_img
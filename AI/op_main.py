@@ -5,12 +5,15 @@ import cv2
 import json                
 import numpy as np
 
-from embedding_extractor import mask_matching_face, arcface_app
-from op_body import process_image
-from video_processing import extract_frames, save_video
+from embedding_extractor import analyze_frame_stream, FrameAnalysis
+from op_body import process_frame as process_body_frame
+from resolution_policy import get_policy
+from video_processing import get_video_info, iter_frames, save_video
+from parallel_processing import process_video_parallel, VIDEO_WORKERS, MIN_SEGMENT_FRAMES
 
 # [1] family_embeddings_string 정의
 family_embeddings_string = {}  # 임베딩 있다고 가정
+OP_SAVE_ARTIFACTS = os.getenv("OP_SAVE_ARTIFACTS", "0") == "1"  # 프레임별 중간 결과(jpg/json) 저장 여부
 def ensure_dirs(paths):
     for p in paths:
         os.makedirs(p, exist_ok=True)
@@ -19,60 +22,67 @@ def normalize_embeddings(raw_embeddings: dict) -> dict:
     return {name: np.array(vec)/np.linalg.norm(vec)
             for name, vec in raw_embeddings.items()}
 
-def process_video(video_path: str, raw_embeddings: dict, output_dir: str):
-    frame_dir  = os.path.join(output_dir, "frames")
-    result_dir = os.path.join(output_dir, "frames_masked")
-    ensure_dirs([output_dir, frame_dir, result_dir])
-
+def process_frame(idx: int, analysis: FrameAnalysis, frame_dir: str = None, result_dir: str = None,
+                  policy=None) -> np.ndarray:
+    """프레임 분석 결과 → 얼굴 마스킹 + 신체 노출 블러 (메모리에서 처리, frame_dir/result_dir가 있으면 중간 결과 저장)
+
+    얼굴 검출/인식은 analysis에서 한 번만 수행된 결과를 마스킹과 신체 단계가 함께 사용
+    """
+    policy = policy or get_policy("op")
+
+    # 1) 얼굴 마스킹 + 신체 단계용 얼굴 정보 (재검출 없음)
+    face_masked = analysis.masked()
+    faces = analysis.face_records()
+
+    # 2) 신체 파이프라인 호출
+    per_frame_dir = os.path.join(frame_dir, f"frame_{idx:04d}") if frame_dir else None
+    vis_img, _ = process_body_frame(face_masked, faces, per_frame_dir, policy)
+
+    # 3) 중간 결과 저장 (선택)
+    if frame_dir:
+        frame_path = os.path.join(frame_dir, f"frame_{idx:04d}.jpg")
+        cv2.imwrite(frame_path, face_masked)
+        with open(frame_path.replace(".jpg", "_multi_embedding.json"), 'w', encoding='utf-8') as fp:
+            json.dump(faces, fp, indent=4)
+    if result_dir:
+        cv2.imwrite(os.path.join(result_dir, f"frame_{idx:04d}_masked.jpg"), vis_img)
+    return vis_img
+
+def process_video(video_path: str, raw_embeddings: dict, output_dir: str,
+                  tracking: bool = False, parallel: bool = True, policy=None,
+                  save_artifacts: bool = OP_SAVE_ARTIFACTS):
+    frame_dir  = os.path.join(output_dir, "frames") if save_artifacts else None
+    result_dir = os.path.join(output_dir, "frames_masked") if save_artifacts else None
+    ensure_dirs([p for p in (output_dir, frame_dir, result_dir) if p])
+
+    policy = policy or get_policy("op")
     normalized = normalize_embeddings(raw_embeddings)
-    frames, fps, size = extract_frames(video_path)
-    if frames is None:
+    video_info = get_video_info(video_path)
+    if video_info is None:
         raise IOError(f"비디오 로드 실패: {video_path}")
+    fps, size, total = video_info
 
-    processed = []
-    for idx, frame in enumerate(frames, start=1):
-        print(f"🎞 Frame {idx}/{len(frames)} 처리 중…")
-
-        # 1) 얼굴 매칭 + 마스킹 → 임시 이미지 저장
-        face_masked = mask_matching_face(frame, normalized)
-        tmp_path = os.path.join(frame_dir, f"frame_{idx:04d}.jpg")
-        cv2.imwrite(tmp_path, face_masked)
-
-        # 2) 얼굴 임베딩 JSON 생성 (무조건 덮어쓰기)
-        face_json = tmp_path.replace(".jpg", "_multi_embedding.json")
-        if os.path.exists(face_json):
-            os.remove(face_json)
-
-        img_bgr = cv2.imread(tmp_path)
-        if img_bgr is None:
-            raise RuntimeError(f"임시 얼굴 이미지 로드 실패: {tmp_path}")
-        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-
-        faces = arcface_app.get(img_rgb)
-        data = []
-        for f in faces:
-            x1, y1, x2, y2 = map(int, f.bbox)
-            w, h = x2 - x1, y2 - y1
-            emb = getattr(f, 'normed_embedding', None) or getattr(f, 'embedding', None)
-            vec = emb.tolist() if emb is not None else []
-            data.append({'bbox': [x1, y1, w, h], 'embedding': vec})
-
-        with open(face_json, 'w', encoding='utf-8') as fp:
-            json.dump(data, fp, indent=4)
-
-        # 3) 최적화된 신체 파이프라인 호출
-        per_frame_dir = os.path.join(frame_dir, f"frame_{idx:04d}")
-        os.makedirs(per_frame_dir, exist_ok=True)
-        _, vis_img = process_image(tmp_path, face_json, per_frame_dir)
-
-        # 4) 결과 프레임 저장
-        out_path = os.path.join(result_dir, f"frame_{idx:04d}_masked.jpg")
-        cv2.imwrite(out_path, vis_img)
-        processed.append(vis_img)
+    out_video = os.path.join(output_dir, "result_masked_op.mp4")
+    if parallel and VIDEO_WORKERS > 1 and total >= 2 * MIN_SEGMENT_FRAMES:
+        # GOP 단위 세그먼트 병렬 처리 (워커마다 얼굴/신체 모델 1회 로드)
+        if not process_video_parallel(video_path, out_video, normalized, fps, size, total,
+                                      tracking=tracking, pipeline="op",
+                                      artifact_dir=output_dir if save_artifacts else None,
+                                      det_size=policy["face_det"], policy=policy):
+            raise IOError(f"비디오 저장 실패: {out_video}")
+        print(f"✅ 처리 완료: {out_video}")
+        return
+
+    def processed_frames():
+        # 얼굴 분석(트래킹/배치) → 얼굴 마스킹 + 신체 파이프라인을 한 프레임씩 연결해 바로 인코더로 넘김
+        analyses = analyze_frame_stream(iter_frames(video_path), normalized, tracking=tracking,
+                                        det_size=policy["face_det"])
+        for idx, analysis in enumerate(analyses, start=1):
+            print(f"🎞 Frame {idx}/{total} 처리 중…")
+            yield process_frame(idx, analysis, frame_dir, result_dir, policy)
 
     # 5) 비디오 합치기
-    out_video = os.path.join(output_dir, "result_masked_op.mp4")
-    if not save_video(processed, out_video, fps, size):
+    if not save_video(processed_frames(), out_video, fps, size):
         raise IOError(f"비디오 저장 실패: {out_video}")
     print(f"✅ 처리 완료: {out_video}")
 
@@ -0,0 +1,120 @@
+# ort_sessions.py
+# onnxruntime 세션 관리: 튜닝된 SessionOptions 적용 + 최적화된 그래프를 디스크에 캐시해 다음 시작 시 재사용
+
+import os
+import time
+import uuid
+import platform
+
+import onnxruntime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ✅ 세션 설정 (환경 변수로 변경 가능)
+ORT_INTRA_THREADS = int(os.getenv("ORT_INTRA_THREADS", "0"))         # 연산자 내부 스레드 수 (0이면 물리 코어 수)
+ORT_INTER_THREADS = int(os.getenv("ORT_INTER_THREADS", "1"))         # 연산자 간 병렬 스레드 수 (parallel 모드에서만 사용)
+ORT_EXECUTION_MODE = os.getenv("ORT_EXECUTION_MODE", "sequential")   # sequential / parallel
+ORT_CACHE_DIR = os.getenv("ORT_CACHE_DIR", os.path.join(BASE_DIR, "model", "ort_cache"))
+ORT_PROVIDERS = ["CPUExecutionProvider"]
+
+
+def session_options(optimized_model_path=None):
+    """튜닝된 SessionOptions 생성 (optimized_model_path가 주어지면 최적화된 그래프를 해당 경로에 저장)"""
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = ORT_INTRA_THREADS
+    options.inter_op_num_threads = ORT_INTER_THREADS
+    options.execution_mode = (onnxruntime.ExecutionMode.ORT_PARALLEL if ORT_EXECUTION_MODE == "parallel"
+                              else onnxruntime.ExecutionMode.ORT_SEQUENTIAL)
+    if optimized_model_path:
+        options.optimized_model_filepath = optimized_model_path
+    return options
+
+
+def cached_model_path(model_path):
+    """원본 모델(크기/수정 시각)과 실행 환경별 최적화 그래프 캐시 경로
+
+    ORT_ENABLE_ALL 그래프에는 CPU별 레이아웃 변환이 포함될 수 있어 머신/버전이 다르면 새로 생성
+    """
+    stat = os.stat(model_path)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    key = f"{stat.st_size}_{int(stat.st_mtime)}_{platform.machine()}_ort{onnxruntime.__version__}"
+    return os.path.join(ORT_CACHE_DIR, f"{stem}_{key}.onnx")
+
+
+def create_session(model_path):
+    """캐시된 최적화 그래프가 있으면 최적화 없이 바로 로드, 없으면 최적화 후 캐시에 저장"""
+    start = time.time()
+    cache_path = cached_model_path(model_path)
+
+    if os.path.exists(cache_path):
+        options = session_options()
+        # 이미 최적화된 그래프이므로 그래프 최적화 단계를 건너뜀
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            session = onnxruntime.InferenceSession(cache_path, options, providers=ORT_PROVIDERS)
+            print(f"✅ ONNX 세션 로드 (캐시): {os.path.basename(model_path)} ({time.time() - start:.2f}s)")
+            return session
+        except Exception as e:
+            print(f"⚠️ 캐시된 그래프 로드 실패, 다시 최적화: {cache_path} | {e}")
+            _remove(cache_path)
+
+    # 여러 워커가 동시에 만들 수 있으므로 프로세스별 임시 파일에 쓴 뒤 원자적으로 교체
+    # (읽는 쪽은 항상 완성된 파일만 봄)
+    os.makedirs(ORT_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        session = onnxruntime.InferenceSession(model_path, session_options(tmp_path), providers=ORT_PROVIDERS)
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, cache_path)
+    finally:
+        _remove(tmp_path)
+    print(f"✅ ONNX 세션 생성 (최적화 후 캐시 저장): {os.path.basename(model_path)} ({time.time() - start:.2f}s)")
+    return session
+
+
+def _remove(path):
+    """다른 워커가 먼저 지웠거나 교체한 경우는 무시"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+if __name__ == "__main__":
+    # 콜드 스타트(캐시 없음) / 캐시 로드 / 기본 옵션의 세션 생성 시간과 추론 지연 비교
+    import sys
+    import numpy as np
+
+    BENCH_INPUT_SIZE = 640  # 검출 모델처럼 H/W가 동적인 입력에 사용할 크기
+
+    def benchmark_inference(session, runs=20):
+        inp = session.get_inputs()[0]
+        # 동적 차원: 배치/채널 위치는 1, 공간 차원(H/W)은 실제 검출 입력 크기
+        shape = [d if isinstance(d, int) else (1 if i < 2 else BENCH_INPUT_SIZE) for i, d in enumerate(inp.shape)]
+        dummy = np.random.rand(*shape).astype(np.float32)
+        session.run(None, {inp.name: dummy})  # 첫 실행(지연 초기화) 제외
+        start = time.time()
+        for _ in range(runs):
+            session.run(None, {inp.name: dummy})
+        return (time.time() - start) / runs * 1000
+
+    for model_path in sys.argv[1:]:
+        start = time.time()
+        default_session = onnxruntime.InferenceSession(model_path, providers=ORT_PROVIDERS)
+        default_load = time.time() - start
+
+        cache_path = cached_model_path(model_path)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        start = time.time()
+        create_session(model_path)
+        cold_load = time.time() - start
+        start = time.time()
+        cached_session = create_session(model_path)
+        cached_load = time.time() - start
+
+        print(f"📊 {os.path.basename(model_path)}")
+        print(f"   세션 생성: 기본 {default_load:.2f}s / 최적화+저장 {cold_load:.2f}s / 캐시 {cached_load:.2f}s")
+        print(f"   추론 지연: 기본 {benchmark_inference(default_session):.1f}ms / "
+              f"튜닝 {benchmark_inference(cached_session):.1f}ms")
@@ -0,0 +1,265 @@
+# parallel_processing.py
+# GOP(키프레임) 단위로 비디오를 나눠 여러 프로세스에서 병렬 마스킹 후 무손실로 이어 붙이는 모듈
+
+import os
+import uuid
+import shutil
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from video_processing import FFmpegWriter
+
+# ✅ 병렬 처리 설정 (환경 변수로 변경 가능)
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "0")) or (os.cpu_count() or 1)
+MIN_SEGMENT_FRAMES = int(os.getenv("MIN_SEGMENT_FRAMES", "150"))  # 세그먼트 최소 길이 (프레임)
+
+_executors = {}
+
+
+def _init_worker(pipeline):
+    """워커 프로세스 시작 시 모델을 한 번만 로드"""
+    cv2.setNumThreads(1)
+    import ort_sessions
+    import model_registry
+    if ort_sessions.ORT_INTRA_THREADS == 0:
+        # 워커마다 전체 코어를 쓰면 VIDEO_WORKERS배로 과다 구독되므로 코어를 나눠 사용
+        ort_sessions.ORT_INTRA_THREADS = max(1, (os.cpu_count() or 1) // VIDEO_WORKERS)
+    if pipeline == "op":
+        model_registry.preload(["face", "yolo", "segmenter", "pose"])
+    else:
+        model_registry.preload(["face"])
+
+
+def get_executor(pipeline="face"):
+    """파이프라인별 프로세스 풀 (모델 로드 비용을 줄이기 위해 재사용)"""
+    if pipeline not in _executors:
+        # onnxruntime 세션이 있는 부모 프로세스를 fork하지 않도록 spawn 사용
+        _executors[pipeline] = ProcessPoolExecutor(
+            max_workers=VIDEO_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(pipeline,),
+        )
+    return _executors[pipeline]
+
+
+def get_keyframes(video_path):
+    """ffprobe 패킷 목록으로 키프레임 위치 조회 → {프레임 인덱스: 세그먼트 시작 seek 시간(초)}
+
+    프레임 인덱스는 표시 순서(pts 정렬) 기준 순위라 B-프레임/열린 GOP에서도 정확하고,
+    seek 시간은 직전 프레임과의 중간 지점(파일 시작 기준)이라 정확 seek 시 키프레임부터 디코딩됨
+    """
+    ffprobe_command = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",  # 디코딩 없이 패킷 헤더만 읽음
+        "-of", "csv=p=0",
+        video_path
+    ]
+    try:
+        result = subprocess.run(ffprobe_command, check=True, capture_output=True, text=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"🚨 키프레임 조회 실패: {e}")
+        return {0: 0.0}
+
+    packets = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.strip().partition(",")
+        if not pts or pts == "N/A":
+            continue
+        packets.append((float(pts), "K" in flags))
+    packets.sort()
+
+    keyframes = {0: 0.0}
+    for index, (pts, key) in enumerate(packets):
+        if key and index > 0:
+            keyframes[index] = (pts + packets[index - 1][0]) / 2 - packets[0][0]
+    return keyframes
+
+
+def split_segments(keyframes, total_frames, num_segments):
+    """키프레임 경계에 맞춰 [start, end) 세그먼트 목록 생성"""
+    target = max(MIN_SEGMENT_FRAMES, total_frames // max(1, num_segments))
+    segments = []
+    start = 0
+    for kf in keyframes:
+        if kf - start >= target and kf < total_frames:
+            segments.append((start, kf))
+            start = kf
+    segments.append((start, None))  # 마지막 세그먼트는 파일 끝까지 (프레임 수 메타데이터 오차 대비)
+    return segments
+
+
+class SegmentReader:
+    """ffmpeg로 seek_time(키프레임)부터 frame_count장을 정확히 디코딩해 BGR 프레임을 yield
+
+    (cv2 CAP_PROP_POS_FRAMES seek은 컨테이너/코덱에 따라 프레임 단위로 정확하지 않음)
+    """
+
+    def __init__(self, video_path, seek_time, frame_count, frame_size):
+        self.frame_size = tuple(frame_size)
+        width, height = self.frame_size
+        # 회전 메타데이터는 ffmpeg 기본 동작대로 적용 (cv2.VideoCapture도 자동 회전된 크기를 frame_size로 보고)
+        ffmpeg_command = ["ffmpeg", "-loglevel", "error"]
+        if seek_time > 0:
+            ffmpeg_command += ["-ss", f"{seek_time:.6f}"]  # 입력 seek + 정확 seek (키프레임 전 프레임 버림)
+        ffmpeg_command += ["-i", video_path, "-map", "0:v:0", "-an", "-vsync", "passthrough"]
+        if frame_count is not None:
+            ffmpeg_command += ["-frames:v", str(frame_count)]
+        ffmpeg_command += [
+            "-vf", f"scale={width}:{height}",  # 출력 크기를 인코더 입력 크기와 맞춤
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "pipe:1"
+        ]
+        self.process = subprocess.Popen(
+            ffmpeg_command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    def frames(self):
+        width, height = self.frame_size
+        frame_bytes = width * height * 3
+        while True:
+            data = self.process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            yield np.frombuffer(data, np.uint8).reshape(height, width, 3).copy()
+
+    def close(self, check=False):
+        """ffmpeg 종료 (check=True면 정상 종료를 기다리고 디코딩 오류 시 IOError, 두 번 호출해도 안전)"""
+        if self.process.stdout.closed:
+            return
+        if not check and self.process.poll() is None:
+            self.process.kill()
+        stderr = self.process.stderr.read().decode(errors="ignore")
+        returncode = self.process.wait()
+        self.process.stdout.close()
+        self.process.stderr.close()
+        if check and returncode != 0:
+            raise IOError(f"세그먼트 디코딩 실패 (code={returncode}): {stderr.strip()}")
+
+
+def _process_segment(video_path, start, end, seek_time, embeddings, output_path, fps, frame_size,
+                     tracking, pipeline, artifact_dir, motion_gating=False, det_size=None, policy=None):
+    """워커 프로세스: 세그먼트 구간을 읽어 마스킹 후 개별 H.264 파일로 인코딩
+
+    policy: op 파이프라인의 해상도 정책 dict (없으면 워커의 기본 정책)
+    """
+    from embedding_extractor import analyze_frame_stream
+    from motion_gate import MotionGate
+
+    try:
+        reader = SegmentReader(video_path, seek_time, None if end is None else end - start, frame_size)
+    except OSError as e:
+        raise IOError(f"비디오 로드 실패: {video_path} ({e})")
+
+    if pipeline == "op":
+        from op_main import process_frame, ensure_dirs
+        # artifact_dir가 있을 때만 프레임별 중간 결과 저장
+        frame_dir = os.path.join(artifact_dir, "frames") if artifact_dir else None
+        result_dir = os.path.join(artifact_dir, "frames_masked") if artifact_dir else None
+        if artifact_dir:
+            ensure_dirs([frame_dir, result_dir])
+
+    gate = MotionGate() if motion_gating else None
+    count = 0
+    try:
+        with FFmpegWriter(output_path, fps, frame_size) as writer:
+            for analysis in analyze_frame_stream(reader.frames(), embeddings, tracking=tracking, gate=gate,
+                                                 det_size=det_size):
+                # 프레임당 얼굴 분석은 한 번 (op 파이프라인은 같은 결과로 신체 단계까지 처리)
+                if pipeline == "op":
+                    frame = process_frame(start + count + 1, analysis, frame_dir, result_dir, policy)
+                else:
+                    frame = analysis.masked()
+                writer.write(frame)
+                count += 1
+            reader.close(check=True)
+            if not writer.close():
+                raise IOError(f"세그먼트 인코딩 실패: {output_path}")
+    finally:
+        reader.close()
+
+    print(f"✅ 세그먼트 완료 [{start}, {end or 'EOF'}) → {count}프레임")
+    return {"frames": count, "skipped": gate.stats["skipped"] if gate is not None else 0}
+
+
+def concat_segments(segment_paths, output_path):
+    """FFmpeg concat demuxer로 세그먼트를 재인코딩 없이 합치기"""
+    list_path = output_path.replace(".mp4", "_segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+
+    try:
+        ffmpeg_command = [
+            "ffmpeg", "-y",
+            "-loglevel", "error",
+            "-f", "concat", "-safe", "0",
+            "-i", list_path,
+            "-c", "copy",  # 무손실 (재인코딩 없음)
+            "-movflags", "+faststart",
+            output_path
+        ]
+        subprocess.run(ffmpeg_command, check=True)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"🚨 FFmpeg 세그먼트 병합 실패: {e}")
+        return False
+    finally:
+        os.remove(list_path)
+
+
+def process_video_parallel(video_path, output_path, embeddings, fps, frame_size, total_frames,
+                           tracking=False, pipeline="face", artifact_dir=None,
+                           motion_gating=False, stats=None, progress=None, det_size=None, policy=None):
+    """GOP 단위 세그먼트를 프로세스 풀에서 병렬 처리 후 하나의 비디오로 합치기
+
+    stats(dict)가 주어지면 처리/스킵 프레임 수를 누적,
+    progress(done, total)가 주어지면 세그먼트가 끝날 때마다 처리된 프레임 수를 보고
+    """
+    keyframes = get_keyframes(video_path)
+    segments = split_segments(sorted(keyframes), total_frames, VIDEO_WORKERS)
+    print(f"🧩 {len(segments)}개 세그먼트로 분할 (workers={VIDEO_WORKERS})")
+
+    work_dir = os.path.join(os.path.dirname(os.path.abspath(output_path)),
+                            f"segments_{uuid.uuid4().hex}")
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        executor = get_executor(pipeline)
+        segment_paths = []
+        futures = []
+        for i, (start, end) in enumerate(segments):
+            segment_path = os.path.join(work_dir, f"segment_{i:04d}.mp4")
+            segment_paths.append(segment_path)
+            futures.append(executor.submit(
+                _process_segment, video_path, start, end, keyframes[start], embeddings, segment_path,
+                fps, frame_size, tracking, pipeline, artifact_dir, motion_gating, det_size, policy,
+            ))
+
+        results = []
+        processed = 0
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception:
+                for pending in futures:
+                    pending.cancel()
+                raise
+            processed += results[-1]["frames"]
+            if progress is not None:
+                progress(processed, total_frames)
+        if stats is not None:
+            stats["frames"] = stats.get("frames", 0) + processed
+            stats["skipped"] = stats.get("skipped", 0) + sum(r["skipped"] for r in results)
+        print(f"✅ 총 {processed}개 프레임 병렬 처리 완료")
+
+        return concat_segments(segment_paths, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,103 @@
+# quantization_eval.py
+# INT8 모델 정확도 확인: fp32 대비 임베딩 코사인 변화량과 가족 매칭(일치/불일치) 판정 일치율 보고
+# 사용법: python quantization_eval.py [--threshold 0.5] [DIR ...]  (각 폴더의 test.jpg + face.json 사용)
+
+import os
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from embedding_extractor import BASE_DIR, bbox_iou, load_face_app
+
+DEFAULT_DIRS = [os.path.join(BASE_DIR, d) for d in ("data", "sample1", "sample2")]
+
+
+def load_sample(sample_dir):
+    """(이미지, 기준 임베딩) 반환 (face.json은 DB에 저장된 가족 임베딩)"""
+    image = cv2.imread(os.path.join(sample_dir, "test.jpg"))
+    with open(os.path.join(sample_dir, "face.json"), "r", encoding="utf-8") as f:
+        reference = np.array(json.load(f)[0]["embedding"], dtype=np.float32)
+    return image, reference / np.linalg.norm(reference)
+
+
+def run_faces(app, image):
+    start = time.time()
+    faces = app.get(image)
+    return faces, time.time() - start
+
+
+def pair_faces(faces_fp32, faces_int8, iou_threshold=0.5):
+    """IoU가 가장 큰 얼굴끼리 짝짓기 (같은 얼굴의 fp32 / int8 결과)"""
+    pairs, remaining = [], list(faces_int8)
+    for face in faces_fp32:
+        best = max(remaining, key=lambda f: bbox_iou(face.bbox, f.bbox), default=None)
+        if best is not None and bbox_iou(face.bbox, best.bbox) >= iou_threshold:
+            pairs.append((face, best))
+            remaining.remove(best)
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 검출/인식 모델 정확도 비교")
+    parser.add_argument("dirs", nargs="*", default=DEFAULT_DIRS)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    app_fp32 = load_face_app("detect+recognize", precision="fp32")
+    # INT8 파일이 없을 때 fp32로 대체되면 fp32끼리 비교해 변화량 0 / 일치율 100%가 나오므로 바로 실패
+    app_int8 = load_face_app("detect+recognize", precision="int8", strict=True)
+    if set(app_int8.precisions.values()) != {"int8"}:
+        raise SystemExit(f"🚨 INT8 모델이 로드되지 않음: {app_int8.precisions}")
+    for app in (app_fp32, app_int8):
+        app.get(np.zeros((640, 640, 3), dtype=np.uint8))  # 첫 실행 지연 초기화는 시간 측정에서 제외
+
+    drifts, agreements, best_agreements = [], [], []
+    detections = {"fp32": 0, "int8": 0, "paired": 0}
+    latency = {"fp32": 0.0, "int8": 0.0}
+
+    for sample_dir in args.dirs:
+        image, reference = load_sample(sample_dir)
+        faces_fp32, t_fp32 = run_faces(app_fp32, image)
+        faces_int8, t_int8 = run_faces(app_int8, image)
+        latency["fp32"] += t_fp32
+        latency["int8"] += t_int8
+
+        pairs = pair_faces(faces_fp32, faces_int8)
+        detections["fp32"] += len(faces_fp32)
+        detections["int8"] += len(faces_int8)
+        detections["paired"] += len(pairs)
+
+        best = {"fp32": (None, -1.0), "int8": (None, -1.0)}
+        for i, (f32, i8) in enumerate(pairs):
+            cos = float(np.dot(f32.normed_embedding, i8.normed_embedding))
+            sim32 = float(np.dot(f32.normed_embedding, reference))
+            sim8 = float(np.dot(i8.normed_embedding, reference))
+            drifts.append(1.0 - cos)
+            agreements.append((sim32 >= args.threshold) == (sim8 >= args.threshold))
+            if sim32 > best["fp32"][1]:
+                best["fp32"] = (i, sim32)
+            if sim8 > best["int8"][1]:
+                best["int8"] = (i, sim8)
+            print(f"🔍 {os.path.basename(sample_dir)} 얼굴 {i}: cos(fp32,int8)={cos:.4f} "
+                  f"sim fp32={sim32:.4f} int8={sim8:.4f}")
+
+        # 이미지별 최종 매칭 결과 (가장 유사한 얼굴 + 임계값 통과 여부) 비교
+        match32 = best["fp32"][0] if best["fp32"][1] >= args.threshold else None
+        match8 = best["int8"][0] if best["int8"][1] >= args.threshold else None
+        best_agreements.append(match32 == match8)
+
+    print("📊 INT8 정확도 리포트")
+    print(f"   로드된 정밀도: 기준 {app_fp32.precisions} / 비교 {app_int8.precisions}")
+    print(f"   검출: fp32 {detections['fp32']} / int8 {detections['int8']} / 짝지어진 얼굴 {detections['paired']}")
+    if drifts:
+        print(f"   코사인 변화량(1-cos): 평균 {np.mean(drifts):.4f} / 최대 {np.max(drifts):.4f}")
+        print(f"   얼굴별 일치/불일치 판정 일치율: {np.mean(agreements):.1%} ({sum(agreements)}/{len(agreements)})")
+    print(f"   이미지별 매칭 결과 일치율: {np.mean(best_agreements):.1%} ({sum(best_agreements)}/{len(best_agreements)})")
+    print(f"   처리 시간: fp32 {latency['fp32']:.2f}s / int8 {latency['int8']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# quantize_models.py
+# buffalo_l 검출(det_10g) / 인식(w600k_r50) 모델의 INT8 양자화 버전 생성
+# 사용법: python quantize_models.py [--mode static|dynamic] [--calib-dir DIR ...]
+# 결과: 원본 옆에 *_int8.onnx 저장 → FACE_MODEL_PRECISION=int8 로 사용
+
+import os
+import glob
+import argparse
+
+import cv2
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                      quantize_dynamic, quantize_static)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from insightface.utils import face_align
+
+from batch_inference import _letterbox
+from embedding_extractor import BASE_DIR, BUFFALO_L_FILES, INSIGHTFACE_DIR, load_face_app, quantized_model_path
+
+DEFAULT_CALIB_DIRS = [os.path.join(BASE_DIR, d) for d in ("data", "sample1", "sample2")]
+CALIB_EXCLUDE = ("masked", "bbox")  # 마스킹/시각화 결과 이미지는 보정 데이터에서 제외
+
+
+def calibration_images(dirs):
+    images = []
+    for d in dirs:
+        for path in sorted(glob.glob(os.path.join(d, "*.jpg")) + glob.glob(os.path.join(d, "*.png"))):
+            if any(word in os.path.basename(path) for word in CALIB_EXCLUDE):
+                continue
+            image = cv2.imread(path)
+            if image is not None:
+                images.append(image)
+    return images
+
+
+class BlobReader(CalibrationDataReader):
+    """미리 만든 입력 텐서 목록을 한 장씩 전달하는 보정 데이터 리더"""
+
+    def __init__(self, input_name, blobs):
+        self.input_name = input_name
+        self.blobs = iter(blobs)
+
+    def get_next(self):
+        blob = next(self.blobs, None)
+        return None if blob is None else {self.input_name: blob}
+
+
+def detection_blobs(det_model, images):
+    """RetinaFace.detect와 같은 전처리 (비율 유지 리사이즈 + 패딩)"""
+    input_size = det_model.input_size or (640, 640)
+    mean, std = det_model.input_mean, det_model.input_std
+    blobs = []
+    for image in images:
+        det_img, _ = _letterbox(image, input_size)
+        blobs.append(cv2.dnn.blobFromImage(det_img, 1.0 / std, input_size, (mean, mean, mean), swapRB=True))
+    return blobs
+
+
+def recognition_blobs(app, images):
+    """fp32 모델로 검출한 얼굴을 정렬한 crop (ArcFaceONNX.get_feat와 같은 전처리)"""
+    rec_model = app.models["recognition"]
+    mean, std = rec_model.input_mean, rec_model.input_std
+    blobs = []
+    for image in images:
+        for face in app.get(image):
+            crop = face_align.norm_crop(image, landmark=face.kps, image_size=rec_model.input_size[0])
+            blobs.append(cv2.dnn.blobFromImage(crop, 1.0 / std, rec_model.input_size, (mean, mean, mean),
+                                               swapRB=True))
+    return blobs
+
+
+def quantize(model_file, mode, input_name=None, blobs=None):
+    output_file = quantized_model_path(model_file)
+    prepared_file = model_file.replace(".onnx", "_prep.onnx")
+    quant_pre_process(model_file, prepared_file)  # shape inference + 그래프 정리 (양자화 권장 전처리)
+    try:
+        if mode == "dynamic" or not blobs:
+            quantize_dynamic(prepared_file, output_file, weight_type=QuantType.QInt8)
+        else:
+            quantize_static(
+                prepared_file, output_file, BlobReader(input_name, blobs),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+                calibrate_method=CalibrationMethod.MinMax,
+            )
+    finally:
+        os.remove(prepared_file)
+    print(f"✅ INT8 모델 저장: {output_file} ({mode}, 보정 샘플 {len(blobs or [])}개)")
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="buffalo_l 검출/인식 모델 INT8 양자화")
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--calib-dir", nargs="*", default=DEFAULT_CALIB_DIRS)
+    args = parser.parse_args()
+
+    app = load_face_app("detect+recognize", precision="fp32")
+    model_dir = os.path.join(INSIGHTFACE_DIR, "models", "buffalo_l")
+
+    det_blobs = rec_blobs = None
+    if args.mode == "static":
+        images = calibration_images(args.calib_dir)
+        print(f"🔹 보정 이미지 {len(images)}장")
+        det_blobs = detection_blobs(app.det_model, images)
+        rec_blobs = recognition_blobs(app, images)
+        if not rec_blobs:
+            print("⚠️ 보정 이미지에서 얼굴을 찾지 못함 → 인식 모델은 dynamic 양자화")
+
+    quantize(os.path.join(model_dir, BUFFALO_L_FILES["detection"][0]), args.mode,
+             app.det_model.input_name, det_blobs)
+    quantize(os.path.join(model_dir, BUFFALO_L_FILES["recognition"][0]), args.mode,
+             app.models["recognition"].input_name, rec_blobs)
+
+
+if __name__ == "__main__":
+    main()
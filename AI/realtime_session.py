@@ -0,0 +1,74 @@
+# realtime_session.py
+# WebSocket 실시간 마스킹 연결 하나의 상태 (가족 갤러리, 얼굴 트랙, 변화 감지기)
+# 연결이 유지되는 동안 임베딩 파싱/갤러리 구성/트래커 초기화를 한 번만 하고 프레임마다 재사용
+
+import image_codec
+from image_codec import Timing
+from motion_gate import MotionGate
+from embedding_extractor import (FaceTracker, as_gallery, tracked_boxes, apply_masks,
+                                 mask_gated_face)
+
+
+class RealtimeSession:
+    """카메라 연결 하나의 마스킹 상태
+
+    tracking=True: 키프레임에서만 검출/인식하고 사이 프레임은 트랙 전파 (연속 프레임 전제)
+    tracking=False: 프레임마다 검출/인식
+    motion_gating=True: 변화가 작은 프레임은 모델 없이 이전 마스크 영역 재사용
+    """
+
+    def __init__(self, family_code, family_embeddings, det_size=None, tracking=False, motion_gating=True):
+        self.family_code = family_code
+        self.det_size = det_size
+        self.tracking = tracking
+        self.motion_gating = motion_gating
+        self.stats = {"frames": 0, "invalid": 0}
+        self.timing = Timing()  # 연결 동안 누적된 decode / infer / encode 시간
+        self.set_family(family_embeddings)
+
+    def set_family(self, family_embeddings):
+        """가족 임베딩 교체 (트랙/변화 감지 상태도 새로 시작)"""
+        self.family_embeddings = as_gallery(family_embeddings)
+        self.tracker = FaceTracker(self.family_embeddings, det_size=self.det_size) if self.tracking else None
+        self.gate = MotionGate() if self.motion_gating else None
+
+    def process(self, frame_bytes, app=None):
+        """JPEG 바이트 → 마스킹된 JPEG 바이트 (디코딩 실패 시 None, 반환: JPEG 바이트, 스킵 여부)
+
+        app: 추론 풀에서 대여한 얼굴 모델 인스턴스 (없으면 레지스트리 공유 인스턴스)
+        """
+        with self.timing.measure("decode"):
+            image, _ = image_codec.decode(frame_bytes)
+        if image is None:
+            self.stats["invalid"] += 1
+            return None
+
+        with self.timing.measure("infer"):
+            masked, skipped = self.mask(image, app)
+        with self.timing.measure("encode"):
+            encoded = image_codec.encode(masked)
+        self.stats["frames"] += 1
+        return encoded, skipped
+
+    def mask(self, image, app=None):
+        if self.tracker is None:
+            return mask_gated_face(image, self.family_embeddings, self.gate, app=app, det_size=self.det_size)
+
+        skipped = self.gate is not None and self.gate.should_skip(image)
+        if skipped:
+            boxes = self.gate.regions
+        else:
+            self.tracker.update(image, app)
+            boxes = tracked_boxes(self.tracker)
+            if self.gate is not None:
+                self.gate.update(boxes)
+        return apply_masks(image, boxes), skipped
+
+    def summary(self):
+        frames = self.stats["frames"]
+        return {
+            "frames": frames,
+            "invalid": self.stats["invalid"],
+            **{f"{name}_ms": total / frames if frames else 0.0 for name, total in self.timing.durations.items()},
+            "skip_rate": self.gate.skip_rate if self.gate is not None else 0.0,
+        }
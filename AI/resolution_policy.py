@@ -0,0 +1,80 @@
+# resolution_policy.py
+# 모델별 작업 해상도 정책: 검출/분석은 낮은 해상도에서, 마스킹은 원본 해상도 좌표로 수행
+
+import os
+import cv2
+
+# ✅ 모델별 기본 작업 해상도 (긴 변 기준 px, 환경 변수로 변경 가능)
+MODEL_RESOLUTIONS = {
+    "face_det": int(os.getenv("RES_FACE_DET", "640")),      # RetinaFace 입력 크기 (정사각)
+    "person_det": int(os.getenv("RES_PERSON_DET", "640")),  # YOLO 입력 크기 (imgsz)
+    "pose": int(os.getenv("RES_POSE", "512")),              # MediaPipe Pose 입력 crop 긴 변
+    "skin": int(os.getenv("RES_SKIN", "960")),              # 세그멘테이션/피부 마스크 계산 해상도 긴 변
+}
+
+# ✅ 요청별 해상도 허용 범위 (범위를 벗어나면 ValueError, RetinaFace 입력은 32의 배수로 반올림)
+MIN_RESOLUTION = 128
+MAX_RESOLUTION = int(os.getenv("RES_MAX", "1920"))
+FACE_DET_STRIDE = 32
+
+# ✅ 엔드포인트별 기본값 (MODEL_RESOLUTIONS 위에 덮어씀)
+ENDPOINT_RESOLUTIONS = {
+    "realtime": {"face_det": 480},
+    "process_video": {},
+    "register": {},
+    "op": {},
+}
+
+
+class ResolutionPolicy:
+    """모델 이름 → 작업 해상도 매핑"""
+
+    def __init__(self, resolutions):
+        self.resolutions = dict(resolutions)
+
+    def __getitem__(self, model):
+        return self.resolutions[model]
+
+    @property
+    def face_det_size(self):
+        size = self.resolutions["face_det"]
+        return (size, size)
+
+    def downscale(self, frame, model):
+        """model의 작업 해상도로 축소한 프레임과 축소 비율 반환 (원본보다 키우지 않음)"""
+        return downscale(frame, self.resolutions[model])
+
+    def to_dict(self):
+        return dict(self.resolutions)
+
+
+def downscale(frame, max_side):
+    """긴 변이 max_side가 되도록 축소 (반환: 축소 이미지, 비율)"""
+    h, w = frame.shape[:2]
+    scale = min(1.0, max_side / max(h, w)) if max_side else 1.0
+    if scale >= 1.0:
+        return frame, 1.0
+    small = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+def validate_resolution(model, value):
+    """요청으로 받은 해상도 검증 (허용 범위 밖이면 ValueError, face_det는 32의 배수로 반올림)"""
+    value = int(value)
+    if not MIN_RESOLUTION <= value <= MAX_RESOLUTION:
+        raise ValueError(f"🚨 {model} 해상도는 {MIN_RESOLUTION}~{MAX_RESOLUTION} 사이여야 합니다: {value}")
+    if model == "face_det":
+        # RetinaFace 앵커 디코딩은 stride(8/16/32)로 나누어떨어지는 입력 크기를 전제로 함
+        value = max(FACE_DET_STRIDE, round(value / FACE_DET_STRIDE) * FACE_DET_STRIDE)
+    return value
+
+
+def get_policy(endpoint=None, **overrides):
+    """기본값 → 엔드포인트 기본값 → 요청별 값(None 제외, 검증 후) 순서로 정책 생성
+
+    요청별 값이 허용 범위를 벗어나면 ValueError
+    """
+    resolutions = dict(MODEL_RESOLUTIONS)
+    resolutions.update(ENDPOINT_RESOLUTIONS.get(endpoint, {}))
+    resolutions.update({k: validate_resolution(k, v) for k, v in overrides.items() if v is not None})
+    return ResolutionPolicy(resolutions)
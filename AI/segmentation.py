@@ -0,0 +1,119 @@
+# segmentation.py
+# TFLite 사람 세그멘테이션 엔진: 인터프리터 여러 개를 풀로 보관하고 호출마다 하나씩 대여
+# (tf.lite.Interpreter는 스레드 간 공유가 안전하지 않으므로 동시 요청은 서로 다른 인스턴스 사용)
+# 인터프리터마다 num_threads / XNNPACK 설정, 모델 입력이 허용하면 여러 프레임을 한 번에 추론
+
+import os
+
+import cv2
+import numpy as np
+
+from inference_pool import ModelPool
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEGMENTER_MODEL = os.path.join(BASE_DIR, "model", "2.tflite")
+
+# ✅ 세그멘테이션 설정 (환경 변수로 변경 가능)
+SEG_POOL_SIZE = int(os.getenv("SEG_POOL_SIZE", "2"))        # 동시에 추론할 인터프리터 수
+SEG_NUM_THREADS = int(os.getenv("SEG_NUM_THREADS", "2"))    # 인터프리터당 스레드 수
+SEG_XNNPACK = os.getenv("SEG_XNNPACK", "1") == "1"          # XNNPACK 델리게이트 사용 (float 모델 CPU 가속)
+SEG_MAX_BATCH = int(os.getenv("SEG_MAX_BATCH", "4"))        # 한 번에 추론할 최대 프레임 수
+
+
+def load_interpreter(model_path=SEGMENTER_MODEL, num_threads=SEG_NUM_THREADS, xnnpack=SEG_XNNPACK):
+    import tensorflow as tf
+    # 기본 op resolver는 XNNPACK 델리게이트를 자동 적용 (num_threads가 델리게이트 스레드 수로도 사용됨)
+    resolver = (tf.lite.experimental.OpResolverType.AUTO if xnnpack
+                else tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+    interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads,
+                                      experimental_op_resolver_type=resolver)
+    interpreter.allocate_tensors()
+    return _Segmenter(interpreter)
+
+
+class _Segmenter:
+    """인터프리터 하나 + 현재 할당된 배치 크기 (배치 크기를 바꿀 때만 텐서 재할당)"""
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.input = interpreter.get_input_details()[0]
+        self.output = interpreter.get_output_details()[0]
+        self.batch = int(self.input["shape"][0])
+        self.batchable = True  # 배치 크기 변경 실패 시 False (한 장씩 추론)
+
+    @property
+    def input_size(self):
+        h, w = self.input["shape"][1:3]
+        return int(w), int(h)
+
+    def run(self, inputs):
+        """(N, h, w, 3) float32 → (N, h, w) 클래스 맵"""
+        if len(inputs) > 1 and self.batchable:
+            if self._resize(len(inputs)):
+                return self._invoke(inputs)
+        return np.concatenate([self._invoke_single(x) for x in inputs])
+
+    def _invoke_single(self, x):
+        if self.batch != 1:
+            self._resize(1)
+        return self._invoke(x[np.newaxis])
+
+    def _invoke(self, batch):
+        self.interpreter.set_tensor(self.input["index"], batch)
+        self.interpreter.invoke()
+        return np.argmax(self.interpreter.get_tensor(self.output["index"]), -1).astype(np.uint8)
+
+    def _resize(self, batch):
+        if batch == self.batch:
+            return True
+        original = list(self.input["shape"])
+        try:
+            self.interpreter.resize_tensor_input(self.input["index"], [batch, *original[1:]])
+            self.interpreter.allocate_tensors()
+        except (ValueError, RuntimeError) as e:
+            # resize는 성공하고 allocate에서 실패할 수 있으므로 원래 입력 크기로 되돌림
+            self.interpreter.resize_tensor_input(self.input["index"], original)
+            self.interpreter.allocate_tensors()
+            print(f"⚠️ 세그멘테이션 모델이 배치 입력을 지원하지 않음 → 한 장씩 추론 ({e})")
+            self.batchable = False
+            return False
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch = batch
+        return True
+
+
+class SegmentationEngine:
+    """인터프리터 풀 기반 세그멘테이션 (segment / segment_batch는 여러 스레드에서 동시에 호출 가능)"""
+
+    def __init__(self, size=SEG_POOL_SIZE, max_batch=SEG_MAX_BATCH, factory=load_interpreter):
+        first = factory()  # 모델 파일/설정 오류는 로드 시점에 바로 드러나도록
+        self.input_size = first.input_size
+        self.max_batch = max(1, max_batch)
+        self.pool = ModelPool(factory, size, initial=first)
+
+    def segment(self, frame, rgb=False, resize=True):
+        return self.segment_batch([frame], rgb, resize)[0]
+
+    def segment_batch(self, frames, rgb=False, resize=True):
+        """BGR 프레임 리스트 → 프레임별 클래스 맵 (uint8)
+
+        rgb=True면 RGB로 변환해 입력, resize=True면 클래스 맵을 각 프레임 해상도로 복원
+        """
+        inputs = np.stack([self._preprocess(frame, rgb) for frame in frames])
+        seg_maps = []
+        for i in range(0, len(inputs), self.max_batch):
+            seg_maps.extend(self.pool.call(lambda segmenter: segmenter.run(inputs[i:i + self.max_batch])))
+        if not resize:
+            return seg_maps
+        return [cv2.resize(seg, (frame.shape[1], frame.shape[0]), interpolation=cv2.INTER_NEAREST)
+                for seg, frame in zip(seg_maps, frames)]
+
+    def warm_up(self):
+        w, h = self.input_size
+        self.segment(np.zeros((h, w, 3), dtype=np.uint8))
+
+    def _preprocess(self, frame, rgb):
+        if rgb:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return cv2.resize(frame, self.input_size).astype(np.float32) / 255.0
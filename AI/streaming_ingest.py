@@ -0,0 +1,212 @@
+# streaming_ingest.py
+# 업로드가 도착하는 동안 요청 본문을 바로 ffmpeg 디코딩 파이프로 흘려보내기 위한 모듈
+# (multipart 스트리밍 파싱 + stdin/stdout ffmpeg 디코더)
+
+import os
+import threading
+import subprocess
+
+import cv2
+import numpy as np
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# ✅ 파이프 디코딩이 불가능한 파일(moov atom이 끝에 있는 MP4 등)을 위해 업로드를 디스크에도 복사할지 여부
+INGEST_SPOOL = os.getenv("INGEST_SPOOL", "1") == "1"
+
+
+class MultipartStream:
+    """multipart 요청 본문을 청크 단위로 파싱해 이벤트 리스트로 변환
+
+    이벤트: ("field", name, value) / ("file_start", name, filename) / ("file_data", bytes) / ("file_end",)
+    """
+
+    def __init__(self, content_type):
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise ValueError("multipart boundary가 없습니다.")
+
+        self.fields = {}
+        self.events = []
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+        self._name = None
+        self._is_file = False
+        self._data = bytearray()
+
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def feed(self, chunk):
+        """청크를 파싱하고 그 사이에 발생한 이벤트 반환"""
+        self.parser.write(chunk)
+        events, self.events = self.events, []
+        return events
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._data = bytearray()
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("latin-1")
+        self._is_file = b"filename" in options
+        if self._is_file:
+            filename = options[b"filename"].decode("utf-8", errors="ignore")
+            self.events.append(("file_start", self._name, filename))
+
+    def _on_part_data(self, data, start, end):
+        if self._is_file:
+            self.events.append(("file_data", bytes(data[start:end])))
+        else:
+            self._data += data[start:end]
+
+    def _on_part_end(self):
+        if self._is_file:
+            self.events.append(("file_end",))
+        else:
+            value = self._data.decode("utf-8")
+            self.fields[self._name] = value
+            self.events.append(("field", self._name, value))
+
+
+class StreamingDecoder:
+    """stdin으로 받은 비디오 바이트를 ffmpeg로 디코딩해 BGR 프레임을 yield (YUV4MPEG 출력 사용)"""
+
+    def __init__(self, spool_path=None):
+        self.spool_path = spool_path
+        self.spool = open(spool_path, "wb") if spool_path else None
+        self.input_closed = threading.Event()
+        self.upload_complete = False  # 파일 파트 끝까지 수신했는지 (스풀 파일 대체 경로는 완전한 업로드만 사용)
+        self.aborted = False          # 업로드 도중 close()로 중단됨
+        self.decoder_alive = True
+        self.fps = None
+        self.frame_size = None
+
+        ffmpeg_command = [
+            "ffmpeg", "-loglevel", "error",
+            "-i", "pipe:0",  # 업로드 스트림
+            "-map", "0:v:0",
+            "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",  # yuv420p는 짝수 해상도 필요
+            "-pix_fmt", "yuv420p",
+            "-f", "yuv4mpegpipe",  # 헤더에 해상도/FPS가 포함된 원시 프레임 스트림
+            "pipe:1"
+        ]
+        self.process = subprocess.Popen(
+            ffmpeg_command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def write(self, data):
+        """업로드 청크 전달 (ffmpeg가 종료된 경우에도 스풀 파일에는 계속 기록)"""
+        if self.spool is not None:
+            self.spool.write(data)
+        if self.decoder_alive:
+            try:
+                self.process.stdin.write(data)
+            except (BrokenPipeError, ValueError):
+                self.decoder_alive = False
+
+    def close_input(self, complete=True):
+        """업로드 종료 알림 (complete=False면 파일 파트가 끝나기 전에 요청 본문이 끝난 경우)"""
+        self.upload_complete = complete
+        if self.spool is not None:
+            self.spool.close()
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.input_closed.set()
+
+    def read_header(self):
+        """YUV4MPEG 헤더를 읽어 (fps, frame_size) 반환, 파이프 디코딩 실패 시 None"""
+        line = self.process.stdout.readline()
+        if not line.startswith(b"YUV4MPEG2"):
+            return None
+
+        width = height = None
+        fps = 30.0
+        for token in line.split()[1:]:
+            key, value = token[:1], token[1:].decode()
+            if key == b"W":
+                width = int(value)
+            elif key == b"H":
+                height = int(value)
+            elif key == b"F":
+                num, den = value.split(":")
+                fps = float(num) / float(den) if float(den) else fps
+        if not width or not height:
+            return None
+
+        self.fps = fps
+        self.frame_size = (width, height)
+        return fps, self.frame_size
+
+    def frames(self):
+        """BGR 프레임을 한 장씩 yield (read_header 이후 호출, ffmpeg가 비정상 종료하면 IOError)"""
+        width, height = self.frame_size
+        frame_bytes = width * height * 3 // 2
+        while True:
+            line = self.process.stdout.readline()
+            if not line.startswith(b"FRAME"):
+                break
+            data = self.process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            yuv = np.frombuffer(data, np.uint8).reshape(height * 3 // 2, width)
+            yield cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_I420)
+
+        # 출력이 끝나면 ffmpeg 종료 코드 확인 (중간에 종료된 경우 잘린 결과를 성공으로 저장하지 않도록)
+        returncode = self.process.wait()
+        if returncode != 0:
+            print(f"🚨 스트림 디코딩 중단 (code={returncode})")
+            raise IOError(f"🚨 스트림 디코딩 중단 (code={returncode})")
+
+    def wait_for_spool(self):
+        """업로드가 끝날 때까지 기다린 뒤 스풀 파일 경로 반환 (파이프 디코딩 실패 시 대체 경로)
+
+        업로드가 중단/불완전하면 잘린 스풀 파일을 디코딩하지 않도록 IOError
+        """
+        self.input_closed.wait()
+        if self.aborted or not self.upload_complete:
+            raise IOError("🚨 업로드가 완료되지 않아 저장된 파일로 처리할 수 없습니다.")
+        return self.spool_path
+
+    def close(self):
+        """ffmpeg 종료 및 자원 정리 (업로드 도중이면 중단으로 표시하고 wait_for_spool 대기를 해제)"""
+        if not self.input_closed.is_set():
+            self.aborted = True
+        if self.spool is not None and not self.spool.closed:
+            self.spool.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        if self.process.stdout:
+            self.process.stdout.close()
+        if self.process.stdin and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+        self.input_closed.set()
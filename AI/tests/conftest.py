@@ -0,0 +1,7 @@
+# tests/conftest.py
+# AI/ 모듈은 패키지가 아닌 평면 구조라 테스트에서 바로 import 할 수 있도록 경로 추가
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,29 @@
+# tests/test_embedding_extractor.py
+
+import numpy as np
+import pytest
+
+pytest.importorskip("insightface")
+pytest.importorskip("torch")
+
+from embedding_extractor import match_faces
+from gallery import Gallery, normalize_rows
+
+
+def test_match_faces_returns_one_result_per_face():
+    rng = np.random.default_rng(0)
+    family = normalize_rows(rng.standard_normal((2, 512)))
+    gallery = Gallery(["a", "b"], family)
+
+    results = match_faces(family[::-1], gallery)
+
+    assert [user_id for user_id, _ in results] == ["b", "a"]
+
+
+def test_match_faces_rejects_dimension_mismatch():
+    rng = np.random.default_rng(0)
+    gallery = Gallery(["a", "b"], normalize_rows(rng.standard_normal((2, 256))))
+    faces = normalize_rows(rng.standard_normal((2, 512)))
+
+    with pytest.raises(ValueError):
+        match_faces(faces, gallery)
@@ -0,0 +1,77 @@
+# tests/test_gallery.py
+
+import os
+
+import numpy as np
+import pytest
+
+from gallery import GalleryStore
+from wire_format import EMBEDDING_DIM, decode_family_embeddings
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+
+
+def test_put_and_get_roundtrip(tmp_path):
+    store = GalleryStore(str(tmp_path))
+    store.put("fam", {"a": _vector(0), "b": _vector(1)})
+
+    gallery = store.get("fam")
+    assert gallery.user_ids == ["a", "b"]
+    assert np.allclose(np.linalg.norm(gallery.matrix, axis=1), 1.0)
+
+
+@pytest.mark.parametrize("embedding", [
+    np.ones(3, dtype=np.float32),                # 차원 불일치
+    np.zeros(EMBEDDING_DIM, dtype=np.float32),   # 정규화 시 NaN
+    np.full(EMBEDDING_DIM, np.inf, dtype=np.float32),
+])
+def test_put_rejects_bad_embedding_before_writing(tmp_path, embedding):
+    store = GalleryStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.put("fam", {"a": embedding})
+    assert os.listdir(tmp_path) == []
+    assert store.get("fam") is None
+
+
+def test_decode_rejects_wrong_dimension():
+    with pytest.raises(ValueError):
+        decode_family_embeddings('{"a": [1.0, 2.0, 3.0]}')
+
+
+def _add_members(root, start):
+    store = GalleryStore(root)
+    for i in range(start, start + 10):
+        store.add("fam", f"user{i}", _vector(i))
+
+
+def test_concurrent_adds_from_processes_keep_every_member(tmp_path):
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_add_members, args=(str(tmp_path), start)) for start in (0, 10, 20)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    gallery = GalleryStore(str(tmp_path)).get("fam")
+    assert sorted(gallery.user_ids) == sorted(f"user{i}" for i in range(30))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_pickled_gallery_keeps_its_version(tmp_path):
+    import pickle
+
+    store = GalleryStore(str(tmp_path))
+    store.put("fam", {"a": _vector(0)})
+    data = pickle.dumps(store.get("fam"))
+
+    store.put("fam", {"b": _vector(1)})
+    store.delete("fam")
+
+    restored = pickle.loads(data)
+    assert restored.user_ids == ["a"]
+    assert np.allclose(restored["a"], _vector(0) / np.linalg.norm(_vector(0)), atol=1e-6)
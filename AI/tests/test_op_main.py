@@ -0,0 +1,79 @@
+# tests/test_op_main.py
+
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+op_main = pytest.importorskip("op_main")
+
+import embedding_extractor
+import parallel_processing
+from resolution_policy import get_policy
+
+
+class InlineExecutor:
+    """프로세스 풀 대신 현재 프로세스에서 바로 실행 (세그먼트 인자 전달만 확인)"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class FakeReader:
+    def __init__(self, video_path, seek_time, frame_count, frame_size):
+        self.count = frame_count or 3
+
+    def frames(self):
+        return (np.zeros((32, 32, 3), dtype=np.uint8) for _ in range(self.count))
+
+    def close(self, check=False):
+        pass
+
+
+class FakeWriter:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def write(self, frame):
+        pass
+
+    def close(self):
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+def test_parallel_segments_receive_custom_policy(monkeypatch, tmp_path):
+    received = []
+
+    def process_frame(idx, analysis, frame_dir=None, result_dir=None, policy=None):
+        received.append(policy)
+        return np.zeros((32, 32, 3), dtype=np.uint8)
+
+    monkeypatch.setattr(op_main, "get_video_info", lambda path: (30.0, (32, 32), 1000))
+    monkeypatch.setattr(op_main, "VIDEO_WORKERS", 2)
+    monkeypatch.setattr(op_main, "process_frame", process_frame)
+    monkeypatch.setattr(parallel_processing, "get_executor", lambda pipeline: InlineExecutor())
+    monkeypatch.setattr(parallel_processing, "get_keyframes", lambda path: {0: 0.0, 500: 16.65})
+    monkeypatch.setattr(parallel_processing, "SegmentReader", FakeReader)
+    monkeypatch.setattr(parallel_processing, "FFmpegWriter", FakeWriter)
+    monkeypatch.setattr(parallel_processing, "concat_segments", lambda paths, output_path: True)
+    monkeypatch.setattr(embedding_extractor, "analyze_frame_stream",
+                        lambda frames, *args, **kwargs: (object() for _ in frames))
+
+    policy = get_policy("op", person_det=320, pose=256, skin=640)
+    op_main.process_video("input.mp4", {}, str(tmp_path), parallel=True, policy=policy, save_artifacts=False)
+
+    assert received
+    for segment_policy in received:
+        assert segment_policy is not None
+        assert (segment_policy["person_det"], segment_policy["pose"], segment_policy["skin"]) == (320, 256, 640)
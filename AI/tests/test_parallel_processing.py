@@ -0,0 +1,66 @@
+# tests/test_parallel_processing.py
+
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+    pytest.skip("ffmpeg/ffprobe가 필요합니다.", allow_module_level=True)
+
+from parallel_processing import SegmentReader, get_keyframes
+from video_processing import get_video_info, iter_frames
+
+
+def _ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *args], check=True)
+
+
+@pytest.fixture
+def rotated_clip(tmp_path):
+    """가로 64x32 영상에 90도 회전 메타데이터를 붙인 클립 (휴대폰 세로 영상과 같은 구조)"""
+    base = str(tmp_path / "base.mp4")
+    rotated = str(tmp_path / "rotated.mp4")
+    _ffmpeg("-f", "lavfi", "-i", "testsrc=size=64x32:rate=10:duration=3",
+            "-c:v", "libx264", "-g", "10", "-pix_fmt", "yuv420p", base)
+    try:
+        _ffmpeg("-display_rotation", "90", "-i", base, "-c", "copy", rotated)
+    except subprocess.CalledProcessError:
+        _ffmpeg("-i", base, "-c", "copy", "-metadata:s:v:0", "rotate=90", rotated)
+    return rotated
+
+
+def test_segment_reader_matches_opencv_orientation(rotated_clip):
+    fps, frame_size, _ = get_video_info(rotated_clip)
+    if frame_size != (32, 64):
+        pytest.skip("이 OpenCV 빌드는 회전 메타데이터를 적용하지 않음")
+    expected = list(iter_frames(rotated_clip))
+
+    reader = SegmentReader(rotated_clip, 0.0, None, frame_size)
+    try:
+        frames = list(reader.frames())
+    finally:
+        reader.close()
+
+    assert len(frames) == len(expected)
+    assert frames[0].shape == expected[0].shape == (64, 32, 3)
+    diff = np.abs(frames[0].astype(np.int16) - expected[0].astype(np.int16)).mean()
+    assert diff < 1
+
+
+def test_segment_reader_starts_at_keyframe(rotated_clip):
+    fps, frame_size, _ = get_video_info(rotated_clip)
+    keyframes = get_keyframes(rotated_clip)
+    start = sorted(keyframes)[1]
+    expected = list(iter_frames(rotated_clip))[start:start + 5]
+
+    reader = SegmentReader(rotated_clip, keyframes[start], 5, frame_size)
+    try:
+        frames = list(reader.frames())
+    finally:
+        reader.close(check=True)
+
+    assert len(frames) == 5
+    for frame, reference in zip(frames, expected):
+        assert np.abs(frame.astype(np.int16) - reference.astype(np.int16)).mean() < 1
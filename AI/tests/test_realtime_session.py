@@ -0,0 +1,45 @@
+# tests/test_realtime_session.py
+
+import numpy as np
+import pytest
+
+pytest.importorskip("insightface")
+pytest.importorskip("torch")
+
+import embedding_extractor
+from realtime_session import RealtimeSession
+
+
+@pytest.fixture
+def detect_calls(monkeypatch):
+    calls = []
+
+    def detect_faces(image, app=None, det_size=None):
+        calls.append(image)
+        return []
+
+    monkeypatch.setattr(embedding_extractor, "detect_faces", detect_faces)
+    return calls
+
+
+def _frames(count=5):
+    return [np.full((48, 64, 3), 127, dtype=np.uint8) for _ in range(count)]
+
+
+def test_without_motion_gating_every_frame_is_detected(detect_calls):
+    session = RealtimeSession("fam", {}, tracking=False, motion_gating=False)
+
+    results = [session.mask(frame) for frame in _frames()]
+
+    assert session.gate is None
+    assert len(detect_calls) == 5
+    assert not any(skipped for _, skipped in results)
+
+
+def test_motion_gating_skips_unchanged_frames(detect_calls):
+    session = RealtimeSession("fam", {}, tracking=False, motion_gating=True)
+
+    results = [session.mask(frame) for frame in _frames()]
+
+    assert len(detect_calls) < 5
+    assert any(skipped for _, skipped in results)
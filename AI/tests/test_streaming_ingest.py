@@ -0,0 +1,61 @@
+# tests/test_streaming_ingest.py
+
+import shutil
+import threading
+
+import pytest
+
+pytest.importorskip("python_multipart")
+if shutil.which("ffmpeg") is None:
+    pytest.skip("ffmpeg가 필요합니다.", allow_module_level=True)
+
+from streaming_ingest import StreamingDecoder
+
+
+def _wait_in_thread(decoder):
+    result = {}
+
+    def fallback():
+        try:
+            result["path"] = decoder.wait_for_spool()
+        except IOError as e:
+            result["error"] = e
+
+    worker = threading.Thread(target=fallback, daemon=True)
+    worker.start()
+    return worker, result
+
+
+def test_close_mid_upload_releases_spool_wait(tmp_path):
+    decoder = StreamingDecoder(str(tmp_path / "upload.mp4"))
+    decoder.write(b"\x00" * 1024)
+    worker, result = _wait_in_thread(decoder)
+
+    decoder.close()  # 클라이언트 연결 끊김
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
+    assert isinstance(result.get("error"), IOError)
+
+
+def test_truncated_upload_is_not_used_as_spool(tmp_path):
+    decoder = StreamingDecoder(str(tmp_path / "upload.mp4"))
+    decoder.write(b"\x00" * 1024)
+    decoder.close_input(complete=False)
+    worker, result = _wait_in_thread(decoder)
+    worker.join(timeout=5)
+    decoder.close()
+
+    assert isinstance(result.get("error"), IOError)
+
+
+def test_complete_upload_returns_spool_path(tmp_path):
+    spool_path = str(tmp_path / "upload.mp4")
+    decoder = StreamingDecoder(spool_path)
+    decoder.write(b"\x00" * 1024)
+    decoder.close_input()
+    worker, result = _wait_in_thread(decoder)
+    worker.join(timeout=5)
+    decoder.close()
+
+    assert result == {"path": spool_path}
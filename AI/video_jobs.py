@@ -0,0 +1,139 @@
+# video_jobs.py
+# 비디오 마스킹 작업을 백그라운드 실행기에서 처리하고 상태/진행률을 조회하기 위한 작업 관리 모듈
+
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ✅ 작업 실행 설정 (환경 변수로 변경 가능)
+VIDEO_JOB_WORKERS = int(os.getenv("VIDEO_JOB_WORKERS", "2"))        # 동시에 실행할 작업 수
+VIDEO_JOB_QUEUE_LIMIT = int(os.getenv("VIDEO_JOB_QUEUE_LIMIT", "16"))  # 대기 + 실행 중 작업 최대 수
+VIDEO_JOB_TTL = int(os.getenv("VIDEO_JOB_TTL", "3600"))             # 완료된 작업/결과 보관 시간 (초)
+VIDEO_JOB_CLEANUP_INTERVAL = int(os.getenv("VIDEO_JOB_CLEANUP_INTERVAL", "60"))  # 만료 작업 정리 주기 (초)
+JOB_EVENT_INTERVAL = 0.5                                             # SSE 진행률 전송 간격 (초)
+
+
+def _delete_file(path):
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        print(f"🚨 파일 삭제 실패: {path} | {str(e)}")
+
+
+class VideoJob:
+    """백그라운드 비디오 작업 하나의 상태"""
+
+    def __init__(self, job_id, output_path=None, filename=None):
+        self.job_id = job_id
+        self.output_path = output_path
+        self.filename = filename
+        self.status = "queued"   # queued → running → done / failed
+        self.processed_frames = 0
+        self.total_frames = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    @property
+    def progress(self):
+        if self.status == "done":
+            return 1.0
+        if not self.total_frames:
+            return 0.0
+        return min(1.0, self.processed_frames / self.total_frames)
+
+    def set_progress(self, processed_frames, total_frames):
+        self.processed_frames = processed_frames
+        self.total_frames = total_frames
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "processed_frames": self.processed_frames,
+            "total_frames": self.total_frames,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class VideoJobManager:
+    """스레드 풀 기반 작업 실행기 (동시 실행 수와 대기열 크기 제한)"""
+
+    def __init__(self, max_workers=VIDEO_JOB_WORKERS, queue_limit=VIDEO_JOB_QUEUE_LIMIT, ttl=VIDEO_JOB_TTL,
+                 cleanup_interval=VIDEO_JOB_CLEANUP_INTERVAL):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="video-job")
+        self.queue_limit = queue_limit
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        if cleanup_interval > 0:
+            # 새 작업이 들어오지 않아도 만료된 결과 파일이 디스크에 남지 않도록 주기적으로 정리
+            threading.Thread(target=self._cleanup_loop, args=(cleanup_interval,),
+                             name="video-job-cleanup", daemon=True).start()
+
+    def is_full(self):
+        with self.lock:
+            active = sum(1 for job in self.jobs.values() if not job.finished)
+        return active >= self.queue_limit
+
+    def submit(self, fn, *args, job_id=None, output_path=None, filename=None):
+        """fn(job, *args)를 백그라운드에서 실행하고 VideoJob 반환"""
+        self.cleanup()
+        job = VideoJob(job_id or uuid.uuid4().hex, output_path=output_path, filename=filename)
+        with self.lock:
+            self.jobs[job.job_id] = job
+        self.executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        self.cleanup()  # 만료된 작업은 조회되지 않도록
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cleanup(self):
+        """보관 시간이 지난 완료 작업과 결과 파일 삭제"""
+        now = time.time()
+        with self.lock:
+            expired = [job for job in self.jobs.values()
+                       if job.finished and now - job.finished_at > self.ttl]
+            for job in expired:
+                del self.jobs[job.job_id]
+        for job in expired:
+            _delete_file(job.output_path)
+
+    def close(self):
+        """정리 스레드 중단"""
+        self.stopped.set()
+
+    def _cleanup_loop(self, interval):
+        while not self.stopped.wait(interval):
+            try:
+                self.cleanup()
+            except Exception as e:
+                print(f"🚨 작업 정리 실패: {str(e)}")
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        print(f"🚀 작업 시작: {job.job_id}")
+        try:
+            job.result = fn(job, *args)
+            job.finished_at = time.time()
+            job.status = "done"
+            print(f"✅ 작업 완료: {job.job_id}")
+        except Exception as e:
+            job.error = str(e)
+            _delete_file(job.output_path)
+            job.finished_at = time.time()
+            job.status = "failed"
+            print(f"🚨 작업 실패: {job.job_id} | {str(e)}")
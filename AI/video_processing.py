@@ -1,59 +1,191 @@
 # video_processing.py
 import cv2
 import subprocess
+import threading
 import os
 
-def extract_frames(video_path):
-    """비디오에서 프레임을 추출하는 함수"""
+# ✅ H.264 인코딩 설정 (속도 ↔ 용량 조절, 환경 변수로 변경 가능)
+FFMPEG_PRESET = os.getenv("FFMPEG_PRESET", "veryfast")
+FFMPEG_CRF = int(os.getenv("FFMPEG_CRF", "23"))
+FRAGMENT_SECONDS = float(os.getenv("FRAGMENT_SECONDS", "2"))  # fMP4 스트리밍 시 프래그먼트(키프레임) 간격
+
+def get_video_info(video_path):
+    """비디오의 FPS, 해상도, 총 프레임 수를 반환하는 함수"""
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
-        return None, None, None
+        return None
 
     fps = cap.get(cv2.CAP_PROP_FPS)
     frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
-
-    frames = []
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
     cap.release()
-    return frames, fps, frame_size
+    return fps, frame_size, frame_count
 
 
-def save_video(frames, output_path, fps, frame_size):
-    """OpenCV로 비디오 저장 후 FFmpeg을 사용해 변환"""
-    temp_output_path = output_path.replace(".mp4", "_temp.mp4")  # 임시 저장 파일
+def iter_frames(video_path):
+    """비디오 프레임을 한 장씩 yield 하는 제너레이터 (전체 프레임을 메모리에 올리지 않음)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return
 
-    # ✅ OpenCV로 임시 MP4 저장
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    out = cv2.VideoWriter(temp_output_path, fourcc, fps, frame_size)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
 
-    if not out.isOpened():
-        return False
 
-    for frame in frames:
-        out.write(frame)
+def extract_frames(video_path):
+    """비디오에서 프레임을 추출하는 함수 (전체 프레임 리스트 반환)"""
+    video_info = get_video_info(video_path)
+    if video_info is None:
+        return None, None, None
 
-    out.release()
+    fps, frame_size, _ = video_info
+    return list(iter_frames(video_path)), fps, frame_size
 
-    # ✅ FFmpeg으로 변환 (H.264 + AAC)
-    try:
+
+class FFmpegWriter:
+    """raw BGR 프레임을 stdin 파이프로 받아 H.264 파일을 한 번에 인코딩하는 클래스"""
+
+    def __init__(self, output_path, fps, frame_size, preset=None, crf=None, fragmented=False):
+        """output_path가 None이면 fragmented MP4를 stdout으로 출력 (fragmented=True 필요)"""
+        self.output_path = output_path
+        self.frame_size = tuple(frame_size)
+        self.preset = preset or FFMPEG_PRESET
+        self.crf = FFMPEG_CRF if crf is None else crf
+
+        width, height = self.frame_size
         ffmpeg_command = [
             "ffmpeg", "-y",  # 기존 파일 덮어쓰기
-            "-i", temp_output_path,  # 입력 파일
+            "-loglevel", "error",
+            "-f", "rawvideo",  # 입력: 압축되지 않은 BGR 프레임
+            "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}",
+            "-r", str(fps or 30),
+            "-i", "pipe:0",  # stdin으로 프레임 수신
+            "-an",
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",  # yuv420p는 짝수 해상도 필요
             "-vcodec", "libx264",  # H.264 변환
-            "-acodec", "aac",  # AAC 오디오 코덱 사용
-            "-strict", "-2",  # AAC 코덱 호환성 설정
-            output_path  # 최종 출력 파일
+            "-preset", self.preset,  # 인코딩 속도 ↔ 파일 크기
+            "-crf", str(self.crf),  # 화질 (낮을수록 고화질)
+            "-pix_fmt", "yuv420p",
         ]
-        subprocess.run(ffmpeg_command, check=True)
+        if fragmented:
+            # 키프레임마다 프래그먼트를 끊어 전체 인코딩 전에 재생 가능한 fMP4 생성
+            ffmpeg_command += [
+                "-g", str(max(1, int(round((fps or 30) * FRAGMENT_SECONDS)))),
+                "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+                "-f", "mp4",
+            ]
+        else:
+            ffmpeg_command += ["-movflags", "+faststart"]
+        ffmpeg_command.append(output_path or "pipe:1")  # 최종 출력 파일 (또는 stdout)
+
+        self.process = subprocess.Popen(
+            ffmpeg_command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE if output_path is None else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+
+    def write(self, frame):
+        if (frame.shape[1], frame.shape[0]) != self.frame_size:
+            raise ValueError(f"프레임 크기 불일치: {frame.shape[1]}x{frame.shape[0]} != {self.frame_size}")
+        self.process.stdin.write(frame.tobytes())
 
-        # ✅ 변환 후 임시 파일 삭제
-        os.remove(temp_output_path)
+    def close(self):
+        """파이프를 닫고 인코딩 완료까지 대기 (성공 여부 반환)"""
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = self.process.stderr.read().decode(errors="ignore")
+        self.process.stderr.close()
+        returncode = self.process.wait()
+        if returncode != 0:
+            print(f"🚨 FFmpeg 인코딩 실패 (code={returncode}): {stderr.strip()}")
+            return False
         return True
-    except subprocess.CalledProcessError as e:
-        print(f"🚨 FFmpeg 변환 실패: {e}")
+
+    def abort(self):
+        """인코딩을 중단하고 불완전한 출력 파일을 삭제"""
+        self.process.kill()
+        self.process.wait()
+        if self.output_path and os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            return None
+        self.abort()
+        return None
+
+
+def save_video(frames, output_path, fps, frame_size, preset=None, crf=None):
+    """FFmpeg 파이프로 프레임을 H.264 비디오로 한 번에 저장 (frames는 리스트 또는 제너레이터)"""
+    try:
+        writer = FFmpegWriter(output_path, fps, frame_size, preset=preset, crf=crf)
+    except OSError as e:
+        print(f"🚨 FFmpeg 실행 실패: {e}")
         return False
+
+    # ✅ 프레임을 받는 즉시 인코더에 기록 (임시 파일/재인코딩 없음)
+    try:
+        for frame in frames:
+            writer.write(frame)
+    except BrokenPipeError:
+        return writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+    return writer.close()
+
+
+def stream_video(frames, fps, frame_size, preset=None, crf=None, chunk_size=64 * 1024):
+    """프레임을 fragmented MP4로 인코딩하면서 완성된 바이트 청크를 바로 yield 하는 제너레이터
+
+    응답 헤더가 이미 전송된 뒤 프레임 생성/인코딩이 실패하면 IOError를 발생시켜
+    응답이 정상 종료(잘린 200)되지 않고 연결이 중단되도록 함
+    """
+    writer = FFmpegWriter(None, fps, frame_size, preset=preset, crf=crf, fragmented=True)
+    errors = []
+
+    def produce():
+        # 마스킹/인코딩 입력은 별도 스레드에서 넣고, 현재 제너레이터는 출력만 읽음
+        try:
+            for frame in frames:
+                writer.write(frame)
+        except BrokenPipeError:
+            pass  # ffmpeg가 먼저 종료됨 → close()에서 종료 코드 확인
+        except Exception as e:
+            print(f"🚨 스트리밍 인코딩 중 오류: {e}")
+            errors.append(e)
+            writer.abort()
+            return
+        if not writer.close():
+            errors.append(IOError("FFmpeg 인코딩 실패"))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while chunk := writer.process.stdout.read1(chunk_size):
+            yield chunk
+        producer.join()
+        if errors:
+            print(f"🚨 스트리밍 응답 중단: {errors[0]}")
+            raise IOError(f"🚨 스트리밍 인코딩 실패: {errors[0]}") from errors[0]
+    finally:
+        # 클라이언트가 연결을 끊은 경우 인코딩 중단
+        if producer.is_alive():
+            writer.abort()
+        producer.join()
+        writer.process.stdout.close()
@@ -0,0 +1,71 @@
+# wire_format.py
+# 임베딩 전송 형식: JSON float 리스트 대신 little-endian float16/float32 바이트의 base64 문자열 지원
+# 요청 헤더 X-Embedding-Encoding: json(기본) / f16 / f32 로 협상하고, 응답에도 같은 형식과 헤더를 사용
+
+import json
+import base64
+
+import numpy as np
+
+EMBEDDING_ENCODING_HEADER = "X-Embedding-Encoding"
+EMBEDDING_DTYPES = {"f16": np.dtype("<f2"), "f32": np.dtype("<f4")}
+EMBEDDING_DIM = 512  # buffalo_l 인식 모델(w600k_r50) 임베딩 차원
+
+
+def get_encoding(value):
+    """헤더 값 → 인코딩 이름 (없으면 json, 알 수 없는 값이면 ValueError)"""
+    encoding = (value or "json").strip().lower()
+    if encoding != "json" and encoding not in EMBEDDING_DTYPES:
+        raise ValueError(f"🚨 지원하지 않는 임베딩 형식: {value} (json / f16 / f32)")
+    return encoding
+
+
+def encode_embedding(embedding, encoding="json"):
+    """임베딩 → JSON float 리스트 또는 base64 문자열"""
+    if encoding == "json":
+        return np.asarray(embedding, dtype=np.float32).tolist()
+    data = np.asarray(embedding, dtype=EMBEDDING_DTYPES[encoding]).tobytes()
+    return base64.b64encode(data).decode("ascii")
+
+
+def decode_embedding(value, encoding="json"):
+    """JSON float 리스트 또는 base64 문자열 → float32 벡터 (리스트는 인코딩과 무관하게 허용)
+
+    형식이 잘못된 값(숫자가 아닌 원소, 중첩 리스트, EMBEDDING_DIM이 아닌 길이, 0/NaN 벡터 등)은 ValueError
+    """
+    if isinstance(value, str):
+        dtype = EMBEDDING_DTYPES.get(encoding, EMBEDDING_DTYPES["f32"])
+        vector = np.frombuffer(base64.b64decode(value), dtype=dtype).astype(np.float32)
+    else:
+        try:
+            vector = np.asarray(value, dtype=np.float32)
+        except (TypeError, ValueError):
+            raise ValueError("🚨 임베딩은 숫자 리스트여야 합니다.")
+    return check_embedding(vector)
+
+
+def check_embedding(vector):
+    """EMBEDDING_DIM 길이의 1차원 벡터이고 노름이 유한한 양수인지 확인 (정규화 시 NaN 방지)"""
+    vector = np.asarray(vector, dtype=np.float32)
+    if vector.shape != (EMBEDDING_DIM,):
+        raise ValueError(f"🚨 임베딩은 길이 {EMBEDDING_DIM}의 1차원 벡터여야 합니다. (shape={vector.shape})")
+    norm = float(np.linalg.norm(vector))
+    if not np.isfinite(norm) or norm == 0.0:
+        raise ValueError("🚨 임베딩 노름이 0이거나 유한하지 않습니다.")
+    return vector
+
+
+def decode_embedding_text(text, encoding="json"):
+    """폼 필드 하나의 임베딩 (JSON 리스트 텍스트 또는 base64 문자열)"""
+    text = text.strip()
+    if text.startswith("["):
+        return decode_embedding(json.loads(text), encoding)
+    return decode_embedding(text.strip('"'), encoding)
+
+
+def decode_family_embeddings(text, encoding="json"):
+    """{user_id: 임베딩} JSON 텍스트(또는 파싱된 dict) → {user_id: float32 벡터}"""
+    items = json.loads(text) if isinstance(text, str) else text
+    if not isinstance(items, dict):
+        raise ValueError("🚨 family_embeddings는 {user_id: 임베딩} 형식의 JSON 객체여야 합니다.")
+    return {user_id: decode_embedding(value, encoding) for user_id, value in items.items()}
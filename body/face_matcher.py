@@ -10,20 +10,18 @@ def find_matching_face(db_json_path, group_json_path, threshold=0.65):
     if not db_faces or not group_faces:
         return None
 
-    # 현재는 첫 번째 사람만 기준 (원하면 반복문으로 여러 명 처리 가능)
-    db_embedding = np.array(db_faces[0]["embedding"], dtype=np.float32)
+    # DB의 모든 사람과 한 번에 거리 계산 (그룹 얼굴 × DB 얼굴)
+    db_embeddings = np.array([face["embedding"] for face in db_faces], dtype=np.float32)
 
-    min_dist = float("inf")
-    matched_bbox = None
+    group_faces = [face for face in group_faces if face.get("embedding")]
+    if not group_faces:
+        return None
+    embeddings = np.array([face["embedding"] for face in group_faces], dtype=np.float32)
+    dists = np.linalg.norm(embeddings[:, None, :] - db_embeddings[None, :, :], axis=2)
 
-    for face in group_faces:
-        embedding = np.array(face.get("embedding", []), dtype=np.float32)
-        if embedding.size == 0:
-            continue
-        dist = np.linalg.norm(db_embedding - embedding)
-        if dist < min_dist:
-            min_dist = dist
-            matched_bbox = tuple(face["bbox"])
+    best = np.unravel_index(dists.argmin(), dists.shape)
+    min_dist = float(dists[best])
+    matched_bbox = tuple(group_faces[best[0]]["bbox"])
 
-    print(f"✅ 얼굴 임베딩 거리: {min_dist:.4f}")
-    return matched_bbox if min_dist < threshold else None
\ No newline at end of file
+    print(f"✅ 얼굴 임베딩 거리: {min_dist:.4f} (db={best[1]})")
+    return matched_bbox if min_dist < threshold else None